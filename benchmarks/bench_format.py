@@ -0,0 +1,189 @@
+"""
+Micro-benchmark: legacy field matching and += formatting vs message_format.
+
+Usage:
+    python benchmarks/bench_format.py [tables]
+
+Formats `tables` station tables (default 10000, about one broadcast minute
+at scale) with rows shaped like the upstream station page.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_format import classify_field, convert_to_12hour, escape_html, format_table_data  # noqa: E402
+
+SAMPLE_ROWS = [
+    ("AWS Location", "Gachibowli"),
+    ("Mandal", "Serilingampally"),
+    ("District", "Hyderabad"),
+    ("Date", "27/05/2025"),
+    ("Last Updated", "27/05/2025 21:00"),
+    ("Rainfall (mm)", "12.5"),
+    ("Cumulative Rainfall (mm)", "48.0"),
+    ("Temperature (Deg C)", "27.3"),
+    ("Min Temperature (Deg C)", "24.1"),
+    ("Max Temperature (Deg C)", "33.9"),
+    ("Humidity (%)", "81"),
+    ("Min Humidity (%)", "62"),
+    ("Max Humidity (%)", "94"),
+    ("Wind Speed (Kmph)", "6.2"),
+    ("Wind Direction (Deg)", "245"),
+    ("Pressure (hPa)", "1004.2"),
+]
+
+
+def synthetic_tables(count):
+    # Vary the values so no layer can cache whole messages
+    return [
+        (str(1000 + i), [(key, f"{value}{i % 7}" if key not in ("Date", "Last Updated") else value)
+                         for key, value in SAMPLE_ROWS])
+        for i in range(count)
+    ]
+
+
+# Verbatim copy of the formatting code before the compiled classifier
+# Flexible field matching function
+def legacy_match_field_type(key):
+    """
+    Match field types using approximate/partial string matching.
+    Returns the field type and appropriate emoji/formatting.
+    """
+    key_lower = key.lower()
+
+    # Location matching (AWS Location, Location, Station Location, etc.)
+    if any(word in key_lower for word in ['location', 'station', 'site']):
+        return 'location', '📍'
+
+    # Mandal/Area matching
+    if any(word in key_lower
+           for word in ['mandal', 'area']):
+        return 'mandal', '🏘️'
+
+    # Last Updated matching - Check for "updated" or "last" specifically first
+    if any(word in key_lower for word in ['updated', 'last']):
+        return 'updated', '🕐'
+
+    # Date matching - Check for "date" fields (including "Date & Time")
+    if any(word in key_lower for word in ['date', 'day']):
+        return 'date', '📅'
+
+    # Generic time matching - only if not caught by above
+    if 'time' in key_lower and not any(
+            word in key_lower for word in ['date', 'updated', 'last']):
+        return 'updated', '🕐'
+
+    # Rainfall matching
+    if any(word in key_lower
+           for word in ['rainfall', 'rain']):
+        return 'rainfall', '🌧️'
+
+    # Temperature matching
+    if any(word in key_lower
+           for word in ['temperature', 'temp']):
+        return 'temperature', '🌡️'
+
+    # Humidity matching
+    if any(word in key_lower for word in ['humidity', 'rh']):
+        return 'humidity', '💧'
+
+    # Wind matching
+    if any(word in key_lower for word in ['wind', 'breeze']):
+        return 'wind', '🌬️'
+
+    # Pressure matching
+    if any(word in key_lower for word in ['pressure', 'barometric']):
+        return 'pressure', '📊'
+
+    # Default
+    return 'other', ''
+
+
+# Format table data for Telegram message with flexible field matching
+def legacy_format_table_data(table_data, suffix=None):
+    if not table_data:
+        return "No table data extracted"
+
+    message = "🌦️ <b>Weather Update</b>"
+    if suffix:
+        message += f" - Station {suffix}"
+    message += "\n\n"
+
+    for key, value in table_data:
+        # Escape HTML characters in key and value
+        key = escape_html(str(key))
+        value = escape_html(str(value))
+
+        # Get field type and emoji using flexible matching
+        field_type, emoji = legacy_match_field_type(key)
+
+        # Convert time format for updated fields
+        if field_type == 'updated' and ':' in value:
+            value = convert_to_12hour(value)
+
+        # Format based on field type
+        if field_type == 'location':
+            message += f"{emoji} <b>Location:</b> {value}\n"
+        elif field_type == 'mandal':
+            message += f"{emoji} <b>Mandal:</b> {value}\n"
+        elif field_type == 'date':
+            message += f"{emoji} <b>Date:</b> {value}\n"
+        elif field_type == 'updated':
+            message += f"{emoji} <b>Last Updated:</b> {value}\n"
+        elif field_type == 'rainfall':
+            message += f"{emoji} <b>{key}:</b> {value}\n"
+        elif field_type == 'temperature':
+            # Add °C if not present and value is numeric
+            if value.replace('.', '').replace(
+                    '-', '').isdigit() and '°' not in value:
+                message += f"{emoji} <b>{key}:</b> {value}°C\n"
+            else:
+                message += f"{emoji} <b>{key}:</b> {value}\n"
+        elif field_type == 'humidity':
+            message += f"{emoji} <b>{key}:</b> {value}\n"
+        elif field_type == 'wind':
+            message += f"{emoji} <b>{key}:</b> {value}\n"
+        elif field_type == 'pressure':
+            message += f"{emoji} <b>{key}:</b> {value}\n"
+        else:
+            # Use emoji if available, otherwise just bold formatting
+            if emoji:
+                message += f"{emoji} <b>{key}:</b> {value}\n"
+            else:
+                message += f"<b>{key}:</b> {value}\n"
+
+    return message
+
+
+def run(label, format_fn, tables):
+    started = time.perf_counter()
+    for suffix, table_data in tables:
+        format_fn(table_data, suffix)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<10} {elapsed * 1000:8.1f} ms  ({elapsed / len(tables) * 1e6:6.1f} us/table)")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    tables = synthetic_tables(count)
+
+    for suffix, table_data in tables[:50]:
+        if format_table_data(table_data, suffix) != legacy_format_table_data(table_data, suffix):
+            print(f"MISMATCH for station {suffix}")
+            sys.exit(1)
+
+    print(f"Formatting {count} tables of {len(SAMPLE_ROWS)} rows")
+    best = {}
+    for _ in range(3):
+        for label, format_fn in (("legacy", legacy_format_table_data), ("compiled", format_table_data)):
+            elapsed = run(label, format_fn, tables)
+            best[label] = min(best.get(label, elapsed), elapsed)
+    print(f"Best: legacy {best['legacy'] * 1000:.1f} ms, compiled {best['compiled'] * 1000:.1f} ms "
+          f"({best['legacy'] / best['compiled']:.2f}x); classifier cache {classify_field.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
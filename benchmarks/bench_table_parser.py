@@ -0,0 +1,140 @@
+"""
+Micro-benchmark: legacy split/find table parser vs table_parser.TableParser.
+
+Usage:
+    python benchmarks/bench_table_parser.py [captured_page.html ...]
+
+Pass one or more station pages saved from URL_PREFIX<suffix> to benchmark
+against real captures. Without arguments a synthetic page with the same
+markup as the upstream station table is used.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from table_parser import TableParser, parse_table_html  # noqa: E402
+
+SAMPLE_ROWS = [
+    ("AWS Location", "Gachibowli"),
+    ("Mandal", "Serilingampally"),
+    ("District", "Hyderabad"),
+    ("Latitude", "17.4401"),
+    ("Longitude", "78.3489"),
+    ("Date", "27/05/2025"),
+    ("Last Updated", "27/05/2025 21:00"),
+    ("Rainfall (mm)", "<b>12.5</b>"),
+    ("Cumulative Rainfall (mm)", "<font color=\"blue\"><b>48.0</b></font>"),
+    ("Temperature (Deg C)", "<b>27.3</b>"),
+    ("Min Temperature (Deg C)", "<b>24.1</b>"),
+    ("Max Temperature (Deg C)", "<b>33.9</b>"),
+    ("Humidity (%)", "<b>81</b>"),
+    ("Min Humidity (%)", "<b>62</b>"),
+    ("Max Humidity (%)", "<b>94</b>"),
+    ("Wind Speed (Kmph)", "<b>6.2</b>"),
+    ("Wind Direction (Deg)", "<b>245</b>"),
+    ("Pressure (hPa)", "<b>1004.2</b>"),
+]
+
+
+def synthetic_page():
+    rows = ''.join(
+        f'<tr>\n  <td><span class="style46">{key}</span></td>\n  <td>{value}</td>\n</tr>\n'
+        for key, value in SAMPLE_ROWS)
+    head = '<html><head><title>AWS Station</title>' + '<style>.style46{}</style>' * 40 + '</head><body>'
+    return f'{head}<table width="100%" border="1">\n{rows}</table>\n<p>footer</p></body></html>'
+
+
+# Verbatim copy of the block previously duplicated across the fetch functions
+def legacy_parse(html):
+    if "Invalid Range" in html:
+        return None, "Invalid station ID - station does not exist"
+
+    table_start = html.find('<table')
+    table_end = html.find('</table>') + len('</table>')
+    if table_start == -1 or table_end == -1:
+        return None, "Table not found in HTML"
+
+    table_html = html[table_start:table_end]
+    rows = [
+        row.strip() for row in table_html.split('<tr>')[1:]
+        if '</tr>' in row
+    ]
+    table_data = []
+
+    for row in rows:
+        cells = [
+            cell.strip() for cell in row.split('<td>')[1:]
+            if '</td>' in cell
+        ]
+        if len(cells) >= 2:
+            key = cells[0].split('</td>')[0].replace(
+                '<span class="style46">', '').replace('</span>',
+                                                      '').strip()
+            value = cells[1].split('</td>')[0]
+            while '<' in value and '>' in value:
+                start = value.find('<')
+                end = value.find('>', start) + 1
+                if end == 0:
+                    break
+                value = value[:start] + value[end:]
+            value = value.strip()
+
+            if key.lower() in ['latitude', 'longitude']:
+                continue
+
+            table_data.append((key, value))
+
+    return table_data, None
+
+
+def chunked_parse(html, size=4096):
+    parser = TableParser()
+    for i in range(0, len(html), size):
+        parser.feed(html[i:i + size])
+    parser.close()
+    return parser.result()
+
+
+# Truncated and malformed pages the parsers must agree on, beside the timed ones
+def edge_pages(html):
+    return [
+        ("no </table>", html.replace('</table>', '')),
+        ("no <table", html.replace('<table', '<div')),
+        ("</table> first", '</table>' + html),
+        ("invalid", html + 'Invalid Range'),
+    ]
+
+
+def main():
+    pages = []
+    for path in sys.argv[1:]:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        pages.append(("synthetic", synthetic_page()))
+
+    for name, html in pages:
+        for case, page in [(name, html)] + [(f"{name}, {edge}", edge_page) for edge, edge_page in edge_pages(html)]:
+            expected = legacy_parse(page)
+            for label, parse in (("single", parse_table_html), ("chunked", chunked_parse)):
+                if parse(page) != expected:
+                    print(f"[{case}] MISMATCH ({label}): {parse(page)!r} != {expected!r}")
+                    sys.exit(1)
+
+        expected = legacy_parse(html)
+        number = 2000
+        results = {}
+        for label, parse in (("legacy", legacy_parse),
+                             ("single-pass", parse_table_html),
+                             ("chunked 4k", chunked_parse)):
+            best = min(timeit.repeat(lambda: parse(html), number=number, repeat=5))
+            results[label] = best / number * 1e6
+        print(f"[{name}] {len(html)} bytes, {len(expected[0] or [])} rows")
+        for label, us in results.items():
+            print(f"  {label:<12} {us:8.1f} us/page  ({results['legacy'] / us:4.2f}x legacy)")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,10 +39,97 @@ INDIAN_TIMEZONE = timezone(timedelta(hours=5, minutes=30))
 TARGET_MINUTE = 16
 RETRY_MINUTES = [17, 18, 19, 20, 21, 22]
 
-# Choose connection priority:
-# "proxy" - Try proxy connections first, fallback to direct
-# "direct" - Try direct connection first, fallback to proxies
-CONNECTION_PRIORITY = "direct"
+# Pre-fetch: seconds before TARGET_MINUTE to start fetching every subscribed
+# station into the cache (0 disables it), and seconds between re-polls of
+# stations whose upstream data hasn't updated yet
+PREFETCH_LEAD_SECONDS = 60
+PREFETCH_POLL_INTERVAL = 15
+
+# Publish-time learning: each station is broadcast PUBLISH_MARGIN_SECONDS after
+# the p95 of the last PUBLISH_SAMPLE_WINDOW times its data was seen to update,
+# once it has PUBLISH_MIN_SAMPLES of them (until then at TARGET_MINUTE). A
+# station's time only moves earlier when PREFETCH_LEAD_SECONDS is larger than
+# PUBLISH_MARGIN_SECONDS; later, from the re-checks, it always can.
+PUBLISH_SAMPLE_WINDOW = 48
+PUBLISH_MIN_SAMPLES = 5
+PUBLISH_MARGIN_SECONDS = 20
+
+# Choose how a station is fetched over direct and the proxies (best health score first):
+# "race-all" - Send to every candidate at once, first answer wins (fastest, most proxy traffic)
+# "hedged" - Send to the best path, add the next only if it hasn't answered within its p90 latency
+# "sequential" - Try one path at a time (least traffic, slowest when paths fail)
+FETCH_POLICY = "hedged"
+
+# Hedge delay bounds in seconds (used before enough latency samples exist, too)
+HEDGE_MIN_DELAY = 0.5
+HEDGE_MAX_DELAY = 3
+
+# Maximum simultaneous requests to one host (the upstream server or a single proxy)
+MAX_CONCURRENT_REQUESTS_PER_HOST = 8
+
+# Keep-alive HTTP pools: connections per pool (one pool per proxy plus one direct),
+# seconds before an unused pool is closed, and seconds an idle connection is kept
+HTTP_POOL_SIZE = 10
+HTTP_POOL_IDLE_TIMEOUT = 900
+HTTP_KEEPALIVE_TIMEOUT = 60
+
+# Outbound Telegram delivery: concurrent send workers, messages per second
+# overall, messages per second and burst size per chat, and resends after a 429
+DELIVERY_WORKERS = 8
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_CHAT_BURST = 3
+TELEGRAM_MAX_RETRIES = 3
+
+# Command handlers: threads running them (one chat's handlers run one at a
+# time), handlers waiting overall and per chat before new ones are refused
+HANDLER_WORKERS = 8
+HANDLER_QUEUE_SIZE = 200
+HANDLER_QUEUE_PER_CHAT = 5
+
+# Parsed station cache: maximum stations kept, seconds to keep a table whose
+# "Last Updated" can't be read, and seconds to keep one the upstream is late to replace
+STATION_CACHE_MAX_ENTRIES = 500
+STATION_CACHE_FALLBACK_TTL = 300
+STATION_CACHE_STALE_TTL = 60
+
+# Rendered station messages kept for reuse (one per station per format variant)
+RENDERED_MESSAGE_CACHE_SIZE = 1000
+
+# Seconds between checks of the stored proxy list version (skipped while a
+# MongoDB change stream is delivering updates)
+PROXY_VERSION_CHECK_INTERVAL = 60
+
+# Backoff for stations that fail during a broadcast: retries, first delay and
+# maximum delay in seconds (doubling in between), and +/- jitter as a fraction
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 60
+RETRY_JITTER = 0.5
+
+# Proxy health: paths tried per fetch attempt (best scores first), EWMA smoothing
+# factor for latency, consecutive failures before a path is rested, seconds
+# it rests, and seconds between saves of the scores to MongoDB
+PROXY_TOP_K = 3
+PROXY_HEALTH_EWMA_ALPHA = 0.3
+PROXY_COOLDOWN_AFTER_FAILURES = 3
+PROXY_COOLDOWN_SECONDS = 300
+PROXY_HEALTH_FLUSH_INTERVAL = 300
+
+# Default for users who haven't chosen with /digest: True sends all of a user's
+# stations in one combined message, False sends one message per station
+DEFAULT_DIGEST_MODE = False
+
+# Structured event log (JSON lines): file, events kept in memory per event
+# type for /events and the /events HTTP endpoint, and bytes before the file
+# is rotated
+EVENT_LOG_FILE = "events.jsonl"
+EVENT_LOG_MAX_EVENTS = 50000
+EVENT_LOG_MAX_BYTES = 20 * 1024 * 1024
+
+# Secret the /events HTTP endpoint requires, as ?token= or an X-Events-Token
+# header; the endpoint is off while it is unset
+EVENTS_TOKEN = os.environ.get('EVENTS_TOKEN')
 
 # Maximum subscriptions per user
 MAX_SUBSCRIPTIONS_PER_USER = 4
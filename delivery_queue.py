@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from telebot.apihelper import ApiTelegramException
+
+import logs
+
+# Queue priorities: replies to commands go out ahead of broadcast messages
+INTERACTIVE = 0
+BULK = 1
+
+
+class TokenBucket:
+    """Rate limiter refilled at `rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def idle(self):
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.burst and now >= self.paused_until
+
+
+# Two chats rate limited this close together mean the bot hit the global limit
+GLOBAL_LIMIT_WINDOW = 1.0
+
+
+class DeliveryQueue:
+    """
+    Outbound queue for Telegram API calls, drained by a fixed number of
+    workers on the engine loop.
+
+    Each call waits for a token from its chat's bucket and then from the
+    global bucket, so bursts such as the hourly broadcast stay under
+    Telegram's limits (about 30 messages/s overall and about 1/s per chat)
+    instead of running into 429 errors. If a 429 still comes back, the chat's
+    bucket is paused for its retry_after and the call goes back to the head
+    of that chat's lane, up to max_retries times. The global bucket is only
+    paused when the limit looks global: the error says so, or another chat
+    was limited within the last GLOBAL_LIMIT_WINDOW seconds.
+
+    Each chat has at most one message with a worker at a time; the others
+    wait in the chat's lane in (priority, sequence) order, so a chat's
+    messages never overtake each other, not even around a 429.
+
+    Calls made with priority=INTERACTIVE are taken off the queue before any
+    BULK ones, so command replies don't wait behind the hourly broadcast.
+
+    Use call() from the engine loop; the Telegram request itself runs in a
+    worker thread because telebot is synchronous.
+    """
+
+    def __init__(self, workers=4, global_rate=30, chat_rate=1, chat_burst=3, max_retries=3):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._busy_chats = set()
+        self._lanes = {}  # chat_id -> heap of entries waiting for a busy chat
+        self._last_limited = (None, 0.0)  # (chat_id, time) of the last 429
+        self._queue = None
+        self._sequence = itertools.count()
+        self._tasks = []
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.ensure_future(self._worker()))
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Drop buckets of chats that are back to a full allowance
+            if len(self._chat_buckets) > 10000:
+                for key in [key for key, value in self._chat_buckets.items() if value.idle()]:
+                    del self._chat_buckets[key]
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def call(self, chat_id, func, *args, priority=BULK, **kwargs):
+        """Queue func(*args, **kwargs) as a message to chat_id and await its result"""
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((priority, next(self._sequence),
+                               str(chat_id), func, args, kwargs, future, time.monotonic(), 0))
+        return await future
+
+    async def _worker(self):
+        while True:
+            entry = await self._queue.get()
+            chat_id = entry[2]
+            if chat_id in self._busy_chats:
+                # Another worker has this chat; wait behind it in the lane
+                heapq.heappush(self._lanes.setdefault(chat_id, []), entry)
+                self._queue.task_done()
+                continue
+            self._busy_chats.add(chat_id)
+            self.in_flight += 1
+            try:
+                retry = await self._deliver(*entry)
+                if retry is not None:
+                    heapq.heappush(self._lanes.setdefault(chat_id, []), retry)
+            except Exception as e:
+                logs.write_log("ERROR", f"Delivery worker error: {e}")
+            finally:
+                self.in_flight -= 1
+                self._release(chat_id)
+                self._queue.task_done()
+
+    def _release(self, chat_id):
+        # Hand the chat's next message (by its original order) back to the queue
+        self._busy_chats.discard(chat_id)
+        lane = self._lanes.get(chat_id)
+        if lane:
+            entry = heapq.heappop(lane)
+            if not lane:
+                del self._lanes[chat_id]
+            self._queue.put_nowait(entry)
+
+    def _is_global_limit(self, chat_id, error):
+        now = time.monotonic()
+        last_chat, last_at = self._last_limited
+        self._last_limited = (chat_id, now)
+        if 'global' in (error.description or '').lower():
+            return True
+        return last_chat is not None and last_chat != chat_id and now - last_at <= GLOBAL_LIMIT_WINDOW
+
+    async def _deliver(self, priority, sequence, chat_id, func, args, kwargs, future, enqueued_at, attempt):
+        """Send one message; returns its entry to retry after a 429, else None"""
+        if future.done():
+            return None
+        chat_bucket = self._chat_bucket(chat_id)
+        await asyncio.sleep(chat_bucket.reserve())
+        await asyncio.sleep(self.global_bucket.reserve())
+
+        # Queue wait is measured once per message, up to its first send attempt
+        if attempt == 0:
+            waited = time.monotonic() - enqueued_at
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+        try:
+            result = await asyncio.to_thread(func, *args, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429 and attempt < self.max_retries:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                self.rate_limited += 1
+                chat_bucket.pause(retry_after)
+                scope = "chat"
+                if self._is_global_limit(chat_id, e):
+                    self.global_bucket.pause(retry_after)
+                    scope = "global"
+                logs.write_log("INFO", f"Telegram {scope} rate limit hit for chat {chat_id}, retrying after {retry_after}s")
+                # Same sequence number: it stays ahead of the chat's later messages
+                return (priority, sequence, chat_id, func, args, kwargs, future, enqueued_at, attempt + 1)
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+            return None
+        except Exception as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+            return None
+
+        self.sent += 1
+        if not future.done():
+            future.set_result(result)
+        return None
+
+    async def close(self, timeout=10):
+        """Give queued messages up to timeout seconds to go out, then stop the workers"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logs.write_log("ERROR", f"Delivery queue closed with {self._queue.qsize()} message(s) unsent")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        delivered = self.sent + self.failed
+        return {
+            "depth": ((self._queue.qsize() if self._queue else 0) + self.in_flight
+                      + sum(len(lane) for lane in self._lanes.values())),
+            "workers": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "avg_wait": self.total_wait / delivered if delivered else 0.0,
+            "max_wait": self.max_wait,
+        }
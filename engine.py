@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+
+class EventLoopThread:
+    """
+    A single long-lived asyncio event loop running in a daemon thread.
+
+    Synchronous code (bot handlers, the scheduler thread) hands coroutines to
+    it with run() or submit() instead of creating a new event loop per call,
+    so sessions, semaphores and in-flight tasks are shared across callers.
+    """
+
+    def __init__(self, name="async-engine"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        self.start()
+        return self._loop
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+
+            def run_loop():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def in_loop_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("EventLoopThread.run() called from inside its own loop; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
@@ -0,0 +1,143 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+import config
+
+
+class EventLog:
+    """
+    Structured events (fetches, sends, broadcast outcomes) as JSON lines.
+
+    Each event is a flat dict: ts, time, event and whichever of station,
+    chat_id, path, latency, outcome and error apply. Events are written to a
+    JSONL file by a background thread (rotated to path + ".1" at max_bytes)
+    and kept in memory, newest last, in one deque per event type, so
+    questions like "failures per proxy in the last 6 hours" are answered
+    from memory without reading the file.
+    """
+
+    def __init__(self, path, tz, max_events=50000, max_bytes=20 * 1024 * 1024):
+        self.path = path
+        self.tz = tz
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self._by_event = {}  # event -> deque of entries, oldest first
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def load(self):
+        """Rebuild the in-memory index from the JSONL files"""
+        loaded = 0
+        for path in (self.path + ".1", self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._index(entry)
+                    loaded += 1
+        return loaded
+
+    def _index(self, entry):
+        with self._lock:
+            events = self._by_event.get(entry.get('event'))
+            if events is None:
+                events = self._by_event[entry.get('event')] = deque(maxlen=self.max_events)
+            events.append(entry)
+
+    def record(self, event, **fields):
+        """Record an event; fields that are None are left out"""
+        now = time.time()
+        entry = {'ts': round(now, 3),
+                 'time': datetime.fromtimestamp(now, self.tz).isoformat(timespec='seconds'),
+                 'event': event}
+        entry.update((key, value) for key, value in fields.items() if value is not None)
+        self._index(entry)
+        self._queue.put(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        self._start_writer()
+        return entry
+
+    def _start_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="event-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < 500:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [item for item in items if isinstance(item, str)]
+            try:
+                if lines:
+                    if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                        os.replace(self.path, self.path + ".1")
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.writelines(lines)
+            except Exception as e:
+                print(f"EVENT LOG ERROR: {e} | {len(lines)} event(s) not written")
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def flush(self, timeout=5):
+        done = threading.Event()
+        self._queue.put(done)
+        self._start_writer()
+        return done.wait(timeout)
+
+    def query(self, hours=None, event=None, limit=None, **filters):
+        """Matching events, newest first; filters compare as strings"""
+        since = time.time() - hours * 3600 if hours else None
+        with self._lock:
+            if event is not None:
+                sources = [list(self._by_event.get(event, ()))]
+            else:
+                sources = [list(events) for events in self._by_event.values()]
+        matches = []
+        for entries in sources:
+            # Newest last, so stop at the first entry outside the window
+            for entry in reversed(entries):
+                if since is not None and entry['ts'] < since:
+                    break
+                if all(str(entry.get(key)) == str(value) for key, value in filters.items()):
+                    matches.append(entry)
+        matches.sort(key=lambda entry: entry['ts'], reverse=True)
+        return matches[:limit] if limit else matches
+
+    def aggregate(self, by, hours=None, event=None, **filters):
+        """
+        [(value of `by`, count, average latency or None)] over the matching
+        events, most frequent first
+        """
+        counts = Counter()
+        latency = {}
+        for entry in self.query(hours, event, **filters):
+            value = entry.get(by)
+            counts[value] += 1
+            if isinstance(entry.get('latency'), (int, float)):
+                total, samples = latency.get(value, (0.0, 0))
+                latency[value] = (total + entry['latency'], samples + 1)
+        return [(value, count, latency[value][0] / latency[value][1] if value in latency else None)
+                for value, count in counts.most_common()]
+
+
+event_log = EventLog(config.EVENT_LOG_FILE, config.INDIAN_TIMEZONE,
+                     max_events=config.EVENT_LOG_MAX_EVENTS,
+                     max_bytes=config.EVENT_LOG_MAX_BYTES)
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+import logs
+from station_cache import find_last_updated
+
+
+# Identify one upstream reading of a station: its "Last Updated" value when the
+# table has one, otherwise a hash of the whole table
+def station_fingerprint(table_data):
+    last_updated = find_last_updated(table_data)
+    if last_updated:
+        return f"updated:{last_updated.strip()}"
+    digest = hashlib.sha1(repr(list(table_data or [])).encode('utf-8')).hexdigest()
+    return f"sha1:{digest}"
+
+
+class FingerprintStore:
+    """
+    Last delivered fingerprint per station, in memory and in MongoDB.
+
+    The broadcast compares a fresh fetch with the fingerprint it last sent
+    for the station. If they match, the upstream hasn't published yet, so
+    nothing is sent. Persisting the fingerprints keeps this true across
+    restarts and failover.
+    """
+
+    def __init__(self, collection, tz):
+        self.collection = collection
+        self.tz = tz
+        self._fingerprints = {}  # suffix -> fingerprint
+        self._lock = threading.Lock()
+
+    def load(self):
+        fingerprints = {}
+        try:
+            for doc in self.collection.find():
+                fingerprints[doc['_id']] = doc.get('fingerprint')
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error loading station fingerprints from MongoDB: {e}")
+            return False
+        with self._lock:
+            self._fingerprints = fingerprints
+        logs.write_log("INFO", f"Loaded fingerprints for {len(fingerprints)} station(s)")
+        return True
+
+    def get(self, suffix):
+        with self._lock:
+            return self._fingerprints.get(suffix)
+
+    def unchanged(self, suffix, fingerprint):
+        """True if this fingerprint was already delivered for the station"""
+        return fingerprint is not None and self.get(suffix) == fingerprint
+
+    def record(self, suffix, fingerprint):
+        """Remember a delivered fingerprint (blocking MongoDB write)"""
+        with self._lock:
+            self._fingerprints[suffix] = fingerprint
+        try:
+            self.collection.update_one(
+                {'_id': suffix},
+                {'$set': {'fingerprint': fingerprint, 'delivered_at': datetime.now(self.tz)}},
+                upsert=True)
+            return True
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error saving fingerprint for station {suffix}: {e}")
+            return False
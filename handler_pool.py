@@ -0,0 +1,104 @@
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+import logs
+
+
+class HandlerPool:
+    """
+    Fixed pool of threads running bot command handlers.
+
+    Handlers for one chat run one at a time and in order, so a user's
+    follow-up step never overtakes the command before it; handlers for
+    different chats run in parallel, so one slow /subscribe validation only
+    holds up its own chat. The backlog is bounded: once max_queue handlers
+    are waiting overall, or max_per_chat for one chat, submit() refuses new
+    work instead of letting everyone's latency grow.
+    """
+
+    def __init__(self, workers=8, max_queue=200, max_per_chat=5, name="handler"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_chat = max_per_chat
+        self.name = name
+        self._pending = {}           # chat key -> deque of (func, args, kwargs, queued_at)
+        self._ready = queue.Queue()  # chat keys with pending work and no running handler
+        self._running = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._unkeyed = itertools.count()
+        self.depth = 0
+        self.completed = 0
+        self.shed = 0
+        self.max_wait = 0.0
+
+    def start(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, key, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) behind key's earlier handlers; False if shed"""
+        if key is None:
+            # Nothing to serialize on
+            key = ("unkeyed", next(self._unkeyed))
+        with self._lock:
+            pending = self._pending.setdefault(key, deque())
+            if self.depth >= self.max_queue or len(pending) >= self.max_per_chat:
+                if not pending:
+                    del self._pending[key]
+                self.shed += 1
+                return False
+            pending.append((func, args, kwargs, time.monotonic()))
+            self.depth += 1
+            schedule = key not in self._running and len(pending) == 1
+            if schedule:
+                self._running.add(key)
+        if schedule:
+            self._ready.put(key)
+        self.start()
+        return True
+
+    def _worker(self):
+        while True:
+            key = self._ready.get()
+            if key is None:
+                return
+            with self._lock:
+                func, args, kwargs, queued_at = self._pending[key].popleft()
+                self.depth -= 1
+            self.max_wait = max(self.max_wait, time.monotonic() - queued_at)
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logs.write_log("ERROR", f"Unhandled error in bot handler: {e}")
+            finally:
+                self.completed += 1
+                with self._lock:
+                    if self._pending[key]:
+                        # The chat's next handler goes to the back of the line
+                        self._ready.put(key)
+                    else:
+                        del self._pending[key]
+                        self._running.discard(key)
+
+    def stop(self):
+        for _ in self._threads:
+            self._ready.put(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": self.depth,
+                "chats": len(self._pending),
+                "workers": len(self._threads),
+                "completed": self.completed,
+                "shed": self.shed,
+                "max_wait": self.max_wait,
+            }
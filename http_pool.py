@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import aiohttp
+
+try:
+    from aiohttp_socks import ProxyConnector
+except ImportError:
+    # Without aiohttp-socks only HTTP(S) proxies can be used
+    ProxyConnector = None
+
+# Key used for connections that don't go through a proxy
+DIRECT = None
+
+SOCKS_SCHEMES = ('socks4', 'socks5')
+SOCKS_SUPPORTED = ProxyConnector is not None
+
+
+def is_socks(proxy_url):
+    return bool(proxy_url) and proxy_url.split('://', 1)[0].lower() in SOCKS_SCHEMES
+
+
+class HttpPool:
+    """
+    Process-wide keep-alive connection pools.
+
+    There is one aiohttp session per proxy URL (scheme://ip:port) plus one
+    for direct traffic, so repeated fetches reuse TCP/TLS connections and
+    proxy tunnels instead of paying for them on every call. Pools that
+    haven't been used for idle_timeout seconds are closed on the next
+    access.
+
+    aiohttp only speaks HTTP proxies, so a SOCKS proxy's session gets an
+    aiohttp-socks connector that tunnels every connection through it; pass
+    request_proxy(proxy_url) as the proxy= of its requests.
+
+    The aiohttp sessions belong to the engine loop and must only be used
+    from coroutines running on it.
+    """
+
+    def __init__(self, pool_size=10, idle_timeout=300, keepalive_timeout=60):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self._async_sessions = {}  # proxy_url -> (ClientSession, last_used)
+        self._last_eviction = time.monotonic()
+
+    async def session(self, proxy_url=DIRECT):
+        """Return the shared aiohttp session for a proxy URL (or DIRECT)"""
+        await self._evict_idle_async()
+        entry = self._async_sessions.get(proxy_url)
+        if entry is None or entry[0].closed:
+            connector = self._connector(proxy_url)
+            session = aiohttp.ClientSession(connector=connector)
+        else:
+            session = entry[0]
+        self._async_sessions[proxy_url] = (session, time.monotonic())
+        return session
+
+    def _connector(self, proxy_url):
+        if not is_socks(proxy_url):
+            return aiohttp.TCPConnector(limit=self.pool_size,
+                                        keepalive_timeout=self.keepalive_timeout)
+        if ProxyConnector is None:
+            raise RuntimeError(f"SOCKS proxy {proxy_url} needs the aiohttp-socks package")
+        return ProxyConnector.from_url(proxy_url, limit=self.pool_size,
+                                       keepalive_timeout=self.keepalive_timeout)
+
+    @staticmethod
+    def request_proxy(proxy_url):
+        """The proxy= argument for a request on session(proxy_url)"""
+        # A SOCKS session's connector already goes through the proxy
+        return None if is_socks(proxy_url) else proxy_url
+
+    def stats(self):
+        return {
+            "async_sessions": len(self._async_sessions),
+        }
+
+    async def _evict_idle_async(self):
+        now = time.monotonic()
+        # Sweeping is cheap but there's no need to do it on every request
+        if now - self._last_eviction < min(self.idle_timeout, 30):
+            return
+        self._last_eviction = now
+        for key, (session, last_used) in list(self._async_sessions.items()):
+            if now - last_used > self.idle_timeout:
+                del self._async_sessions[key]
+                await session.close()
+
+    async def close(self):
+        """Close every pooled session (call on the engine loop at shutdown)"""
+        sessions = [session for session, _ in self._async_sessions.values()]
+        self._async_sessions.clear()
+        await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
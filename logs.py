@@ -1,11 +1,60 @@
+import atexit
+import glob
+import gzip
 import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks (Windows): only this process is kept in order
+    fcntl = None
+
 # Indian timezone (UTC+5:30)
 INDIAN_TIMEZONE = timezone(timedelta(hours=5, minutes=30))
 LOG_FILE = "logs.txt"
 MAX_LOG_LINES = 4000
 
+# LOG_FILE is append-only: when it reaches SEGMENT_LINES it is gzipped into
+# LOG_ARCHIVE_DIR as logs_<first>_<last>.txt.gz (the times of its first and
+# last lines) and a new LOG_FILE is started. Archives are deleted oldest
+# first once they take more than LOG_ARCHIVE_MAX_MB or are older than
+# LOG_ARCHIVE_MAX_DAYS.
+SEGMENT_LINES = MAX_LOG_LINES
+LOG_ARCHIVE_DIR = "log_archive"
+ARCHIVE_MAX_BYTES = int(float(os.environ.get('LOG_ARCHIVE_MAX_MB', 50)) * 1024 * 1024)
+ARCHIVE_MAX_AGE = timedelta(days=float(os.environ.get('LOG_ARCHIVE_MAX_DAYS', 7)))
+# Second segment written by older versions, archived on the next rotation
+PREVIOUS_LOG_FILE = LOG_FILE + ".1"
+
+# Levels in increasing severity, for filtering exports
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# A queued line waits up to FLUSH_INTERVAL seconds for others to share its
+# write, which happens sooner once FLUSH_BATCH lines are waiting or flush()
+# is called
+FLUSH_INTERVAL = 1.0
+FLUSH_BATCH = 200
+
+# Writes and rotations also take an exclusive lock on LOCK_FILE, so several
+# processes sharing the log (e.g. a failover.py child and its restart) never
+# interleave or rotate under each other. Set LOG_FILE_LOCK=0 to turn it off.
+LOCK_FILE = LOG_FILE + ".lock"
+USE_FILE_LOCK = fcntl is not None and os.environ.get('LOG_FILE_LOCK', '1') != '0'
+
+# Every thread only puts lines on _queue; the single writer thread owns the
+# files. Besides lines, the queue carries threading.Event flush markers.
+_queue = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+_segment_lines = None
+_segment_state = None  # (inode, size) of LOG_FILE after our last write
+
 
 def get_indian_time():
     """Get current time formatted in Indian timezone"""
@@ -13,51 +62,235 @@ def get_indian_time():
 
 
 def write_log(level, message):
-    """Write a log entry to the log file"""
+    """Write a log entry to the log file (queued, never waits for the disk)"""
     try:
         timestamp = get_indian_time()
         log_entry = f"{timestamp} - {level.upper()} - {message}\n"
+        _queue.put(log_entry)
+        _start_writer()
+
+    except Exception as e:
+        print(f"LOG ERROR: {e} | Original message: {level.upper()} - {message}")
+
+
+def _start_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+            _writer.start()
 
+
+def _write_loop():
+    while True:
+        items = [_queue.get()]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        # Collect for up to FLUSH_INTERVAL, but a flush marker is served now
+        while isinstance(items[-1], str) and len(items) < FLUSH_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _handle(items)
+
+
+def _handle(items):
+    lines = []
+    for item in items:
+        if isinstance(item, str):
+            lines.append(item)
+            continue
+        # A flush marker: the lines queued before it go to disk first
+        _write(lines)
         lines = []
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                lines = f.readlines()
+        item.set()
+    _write(lines)
 
-        lines.append(log_entry)
 
-        if len(lines) > MAX_LOG_LINES:
-            lines = lines[-MAX_LOG_LINES:]
+@contextmanager
+def _file_lock():
+    if not USE_FILE_LOCK:
+        yield
+        return
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
 
-        with open(LOG_FILE, "w", encoding="utf-8") as f:
-            f.writelines(lines)
 
+def _write(lines):
+    if not lines:
+        return
+    try:
+        with _file_lock():
+            _append(lines)
     except Exception as e:
-        print(f"LOG ERROR: {e} | Original message: {level.upper()} - {message}")
+        print(f"LOG ERROR: {e} | {len(lines)} line(s) not written")
 
 
-def replace_last_checking_log(message):
-    """Replace last 'Checking Indian time' log with new one"""
+def _file_state(path):
     try:
-        timestamp = get_indian_time()
-        new_log_line = f"{timestamp} - INFO - {message}\n"
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size
 
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                lines = f.readlines()
 
-            for i in range(len(lines) - 1, -1, -1):
-                if "Checking Indian time:" in lines[i]:
-                    lines.pop(i)
-                    break
+def _append(lines):
+    global _segment_lines, _segment_state
+    # Another process wrote or rotated since our last write: count again
+    if _segment_lines is None or _file_state(LOG_FILE) != _segment_state:
+        _segment_lines = _count_lines(LOG_FILE)
+    while lines:
+        room = SEGMENT_LINES - _segment_lines
+        if room <= 0:
+            _rotate()
+            continue
+        chunk, lines = lines[:room], lines[room:]
+        with open(LOG_FILE, "a", encoding="utf-8") as f:
+            f.writelines(chunk)
+        _segment_lines += len(chunk)
+    _segment_state = _file_state(LOG_FILE)
 
-            lines.append(new_log_line)
 
-            with open(LOG_FILE, "w", encoding="utf-8") as f:
-                f.writelines(lines)
-        else:
-            with open(LOG_FILE, "w", encoding="utf-8") as f:
-                f.write(new_log_line)
+def _rotate():
+    global _segment_lines
+    for path in (PREVIOUS_LOG_FILE, LOG_FILE):
+        if os.path.exists(path):
+            _archive(path)
+    _segment_lines = 0
+    _prune_archives()
 
-    except Exception as e:
-        write_log("INFO", message)
-        print(f"LOG REPLACE ERROR: {e}")
+
+def _line_time(line):
+    """The "YYYY-MM-DD HH:MM:SS" stamp a log line starts with, or None"""
+    stamp = line[:19]
+    if len(stamp) == 19 and stamp[4] == '-' and stamp[10] == ' ' and stamp[13] == ':':
+        return stamp
+    return None
+
+
+def _compact(stamp):
+    return stamp.replace('-', '').replace(':', '').replace(' ', 'T')
+
+
+def _archive(path):
+    first = last = None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            stamp = _line_time(line)
+            if stamp:
+                first = first or stamp
+                last = stamp
+    now = datetime.now(INDIAN_TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
+    name = f"logs_{_compact(first or now)}_{_compact(last or now)}"
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    target = os.path.join(LOG_ARCHIVE_DIR, name + ".txt.gz")
+    suffix = 1
+    while os.path.exists(target):
+        target = os.path.join(LOG_ARCHIVE_DIR, f"{name}-{suffix}.txt.gz")
+        suffix += 1
+    with open(path, "rb") as src, gzip.open(target + ".tmp", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(target + ".tmp", target)
+    os.remove(path)
+
+
+def _archive_range(path):
+    """(first, last) line times of an archive, from its name"""
+    name = os.path.basename(path)[len("logs_"):].split(".")[0]
+    first, last = name.split("_")[:2]
+    last = last.split("-")[0]
+    expand = lambda compact: f"{compact[0:4]}-{compact[4:6]}-{compact[6:8]} {compact[9:11]}:{compact[11:13]}:{compact[13:15]}"
+    return expand(first), expand(last)
+
+
+def _archive_order(path):
+    # Segments rotated within the same second get a -N counter after the name
+    name = os.path.basename(path).split(".")[0]
+    base, _, counter = name.partition("-")
+    return base, int(counter or 0)
+
+
+def archives():
+    """Archived segments, oldest first"""
+    return sorted(glob.glob(os.path.join(LOG_ARCHIVE_DIR, "logs_*.txt.gz")), key=_archive_order)
+
+
+def _prune_archives():
+    paths = archives()
+    oldest_kept = (datetime.now(INDIAN_TIMEZONE) - ARCHIVE_MAX_AGE).strftime("%Y-%m-%d %H:%M:%S")
+    total = sum(os.path.getsize(path) for path in paths)
+    for path in paths:
+        if total <= ARCHIVE_MAX_BYTES and _archive_range(path)[1] >= oldest_kept:
+            break
+        total -= os.path.getsize(path)
+        os.remove(path)
+
+
+def _count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def flush(timeout=5):
+    """Wait until every line logged so far is on disk"""
+    done = threading.Event()
+    _queue.put(done)
+    _start_writer()
+    return done.wait(timeout)
+
+
+def log_segments():
+    """Paths of the log segments that exist (archives and the current file), oldest first"""
+    return archives() + [path for path in (PREVIOUS_LOG_FILE, LOG_FILE) if os.path.exists(path)]
+
+
+def export_logs(out, start=None, end=None, min_level=None):
+    """
+    Stream the log lines between start and end ("YYYY-MM-DD HH:MM:SS" IST,
+    both optional) at min_level or above into `out` as gzip, reading only
+    the segments that overlap the range. Returns the number of lines.
+    """
+    flush()
+    min_rank = LEVELS.index(min_level.upper()) if min_level else 0
+    count = 0
+    with gzip.GzipFile(fileobj=out, mode="wb") as dst:
+        for path in log_segments():
+            if path.endswith(".gz"):
+                first, last = _archive_range(path)
+                if (start and last < start) or (end and first > end):
+                    continue
+                opener = gzip.open
+            else:
+                opener = open
+            try:
+                with opener(path, "rt", encoding="utf-8", errors="replace") as src:
+                    keep = False
+                    for line in src:
+                        stamp = _line_time(line)
+                        # Lines without a stamp continue the entry before them
+                        if stamp:
+                            level = line[26:].split(" - ", 1)[0].strip()
+                            rank = LEVELS.index(level) if level in LEVELS else 0
+                            keep = ((not start or stamp >= start) and (not end or stamp <= end)
+                                    and rank >= min_rank)
+                        if keep:
+                            dst.write(line.encode("utf-8"))
+                            count += 1
+            except FileNotFoundError:
+                # Archived or pruned while we were reading
+                continue
+    return count
+
+
+atexit.register(flush)
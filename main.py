@@ -1,5 +1,4 @@
 import os
-import requests
 import telebot
 import time
 import threading
@@ -7,13 +6,30 @@ import asyncio
 import aiohttp
 import psutil
 import platform
-from requests.exceptions import RequestException, ProxyError, ConnectTimeout
-from datetime import datetime
+from datetime import datetime, timedelta
 from uuid import uuid4
 import re
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+import tempfile
+from collections import deque
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, ServerSelectionTimeoutError
+from urllib.parse import urlsplit
 from webserver import keep_alive
+from delivery_queue import BULK, INTERACTIVE, DeliveryQueue
+from engine import EventLoopThread
+from event_log import event_log
+from fingerprint_store import FingerprintStore, station_fingerprint
+from handler_pool import HandlerPool
+from http_pool import SOCKS_SCHEMES, SOCKS_SUPPORTED, HttpPool
+from message_format import RenderedMessageCache, escape_html
+from proxy_registry import ProxyRegistry
+from publish_times import PublishTimeLearner
+from retry_scheduler import RetryScheduler
+from station_cache import StationCache, find_last_updated, parse_last_updated
+from status import status_board
+from subscription_store import SubscriptionStore
+from table_parser import INVALID_STATION_ERROR, parse_table_stream
+from user_settings import UserSettingsStore
 import config
 import logs
 
@@ -26,655 +42,729 @@ for var in required_env_vars:
 if missing_vars:
     raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
-# Telegram bot
-bot = telebot.TeleBot(config.BOT_TOKEN)
+# Telegram's maximum message length in characters
+TELEGRAM_MESSAGE_LIMIT = 4096
 
-# MongoDB connection (already checked by required_env_vars)
+# Reply sent when a chat or the whole handler pool is too far behind
+HANDLER_BUSY_TEXT = "⏳ The bot is busy right now, please try again in a minute."
 
 
-# Initialize MongoDB client
-mongo_client = None
-db = None
+# Chat of an incoming update (a message, or the message of a callback query)
+def update_chat_id(update):
+    chat = getattr(update, 'chat', None) or getattr(getattr(update, 'message', None), 'chat', None)
+    return getattr(chat, 'id', None)
 
 
-def init_mongodb():
-    global mongo_client, db
-    try:
-        mongo_client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
-        # Test the connection
-        mongo_client.admin.command('ping')
-        db = mongo_client.weather_bot
-        logs.write_log("INFO", "MongoDB connection established successfully")
-        return True
-    except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-        logs.write_log("ERROR", f"Failed to connect to MongoDB: {e}")
-        return False
+# Telegram bot whose outgoing messages and edits all go through delivery_queue
+# (reply_to uses send_message too), so every call is rate limited. The
+# synchronous calls come from command handlers and are queued as INTERACTIVE,
+# ahead of the broadcast. Handlers themselves run on handler_pool.
+class QueuedTeleBot(telebot.TeleBot):
+    def send_message(self, chat_id, text, **kwargs):
+        return engine.run(self.send_message_async(chat_id, text, priority=INTERACTIVE, **kwargs))
 
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return engine.run(self.edit_message_text_async(text, chat_id, message_id, priority=INTERACTIVE, **kwargs))
 
-# Load subscriptions from MongoDB
-def load_subscriptions():
-    try:
-        if db is None:
-            logs.write_log("ERROR", "MongoDB not initialized")
-            return {}
-
-        subscriptions = {}
-        cursor = db.subscriptions.find()
-        for doc in cursor:
-            chat_id = doc['chat_id']
-            suffixes = doc.get('suffixes', [])
-            # Handle old format conversion
-            if isinstance(suffixes, str):
-                suffixes = [suffixes]
-            subscriptions[chat_id] = suffixes
-
-        return subscriptions
-    except Exception as e:
-        logs.write_log("ERROR", f"Error loading subscriptions from MongoDB: {e}")
-        return {}
+    async def send_message_async(self, chat_id, text, priority=BULK, **kwargs):
+        return await delivery_queue.call(
+            chat_id, super().send_message, chat_id, text, priority=priority, **kwargs)
 
+    async def edit_message_text_async(self, text, chat_id=None, message_id=None, priority=BULK, **kwargs):
+        return await delivery_queue.call(
+            chat_id, super().edit_message_text, text, chat_id, message_id, priority=priority, **kwargs)
 
-def save_subscriptions(subscriptions):
-    try:
-        if db is None:
-            logs.write_log("ERROR", "MongoDB not initialized")
+    # telebot hands every handler (and next-step handler) to _exec_task;
+    # run them on handler_pool, one at a time per chat, and tell the chat
+    # to try again when its share of the pool is full
+    def _exec_task(self, task, *args, **kwargs):
+        chat_id = update_chat_id(args[0]) if args else None
+        if handler_pool.submit(chat_id, task, *args, **kwargs):
             return
+        logs.write_log("INFO", f"Handler pool full, shedding update from chat {chat_id}")
+        if chat_id is not None:
+            engine.submit(self.send_message_async(chat_id, HANDLER_BUSY_TEXT, priority=INTERACTIVE))
 
-        # Clear existing subscriptions
-        db.subscriptions.delete_many({})
-
-        # Insert new subscriptions
-        for chat_id, suffixes in subscriptions.items():
-            if suffixes:  # Only save if user has subscriptions
-                db.subscriptions.insert_one({
-                    'chat_id':
-                    chat_id,
-                    'suffixes':
-                    suffixes,
-                    'updated_at':
-                    datetime.now(config.INDIAN_TIMEZONE)
-                })
-
-        logs.write_log("INFO", "Subscriptions saved to MongoDB successfully")
-    except Exception as e:
-        logs.write_log("ERROR", f"Error saving subscriptions to MongoDB: {e}")
 
+bot = QueuedTeleBot(config.BOT_TOKEN)
 
-# Load proxies from MongoDB
-def load_proxies():
-    try:
-        if db is None:
-            logs.write_log("ERROR", "MongoDB not initialized")
-            return {"proxies": []}
-
-        # Get proxies document
-        proxies_doc = db.proxies.find_one({'_id': 'proxy_config'})
-        if proxies_doc:
-            return {
-                'proxies': proxies_doc.get('proxies', [])
-            }
-        else:
-            # Create default document if it doesn't exist
-            default_config = {"proxies": []}
-            db.proxies.insert_one({
-                '_id': 'proxy_config',
-                'proxies': [],
-                'updated_at': datetime.now(config.INDIAN_TIMEZONE)
-            })
-            return default_config
-    except Exception as e:
-        logs.write_log("ERROR", f"Error loading proxies from MongoDB: {e}")
-        return {"proxies": []}
+# Shared asyncio loop for all fetching and broadcast work
+engine = EventLoopThread()
 
+# Parsed station tables shared by /rf, /subscribe and the scheduler
+station_cache = StationCache(config.INDIAN_TIMEZONE,
+                             config.TARGET_MINUTE,
+                             publish_offset=lambda suffix: station_publish_offset(suffix),
+                             max_entries=config.STATION_CACHE_MAX_ENTRIES,
+                             fallback_ttl=config.STATION_CACHE_FALLBACK_TTL,
+                             stale_ttl=config.STATION_CACHE_STALE_TTL)
 
-def save_proxies(proxies_data):
-    try:
-        if db is None:
-            logs.write_log("ERROR", "MongoDB not initialized")
-            return
-
-        # Update or insert proxies configuration
-        db.proxies.replace_one({'_id': 'proxy_config'}, {
-            '_id': 'proxy_config',
-            'proxies': proxies_data.get('proxies', []),
-            'updated_at': datetime.now(config.INDIAN_TIMEZONE)
-        },
-                               upsert=True)
-
-        logs.write_log("INFO", "Proxies saved to MongoDB successfully")
-    except Exception as e:
-        logs.write_log("ERROR", f"Error saving proxies to MongoDB: {e}")
+# Outbound Telegram queue with global and per-chat token buckets
+delivery_queue = DeliveryQueue(workers=config.DELIVERY_WORKERS,
+                               global_rate=config.TELEGRAM_GLOBAL_RATE,
+                               chat_rate=config.TELEGRAM_CHAT_RATE,
+                               chat_burst=config.TELEGRAM_CHAT_BURST,
+                               max_retries=config.TELEGRAM_MAX_RETRIES)
 
+# Threads running command handlers, serialized per chat with a bounded backlog
+handler_pool = HandlerPool(workers=config.HANDLER_WORKERS,
+                           max_queue=config.HANDLER_QUEUE_SIZE,
+                           max_per_chat=config.HANDLER_QUEUE_PER_CHAT)
 
-# Convert 24-hour time to 12-hour AM/PM format with date
-def convert_to_12hour(datetime_str):
-    try:
-        # Handle full date-time string (e.g., "27/05/2025 21:00" or "27/05/2025 23:00")
-        if ' ' in datetime_str and ':' in datetime_str:
-            date_part, time_part = datetime_str.split(' ', 1)
-
-            # Parse hour and minute
-            if ':' in time_part:
-                hour, minute = map(int, time_part.split(':'))
-
-                # Convert to 12-hour format
-                if hour == 0:
-                    time_12h = f"12:{minute:02d} AM"
-                elif hour < 12:
-                    time_12h = f"{hour}:{minute:02d} AM"
-                elif hour == 12:
-                    time_12h = f"12:{minute:02d} PM"
-                else:
-                    time_12h = f"{hour-12}:{minute:02d} PM"
-
-                return f"{date_part} {time_12h}"
-            else:
-                return datetime_str
-        elif ':' in datetime_str and '/' not in datetime_str:
-            # If no space but has colon, assume it's just time
-            hour, minute = map(int, datetime_str.split(':'))
-            if hour == 0:
-                return f"12:{minute:02d} AM"
-            elif hour < 12:
-                return f"{hour}:{minute:02d} AM"
-            elif hour == 12:
-                return f"12:{minute:02d} PM"
-            else:
-                return f"{hour-12}:{minute:02d} PM"
-        else:
-            return datetime_str
-    except:
-        return datetime_str  # Return original if conversion fails
+# Rendered station messages, built once per station update and sent to many
+rendered_messages = RenderedMessageCache(max_entries=config.RENDERED_MESSAGE_CACHE_SIZE)
 
 
-# Flexible field matching function
-def match_field_type(key):
-    """
-    Match field types using approximate/partial string matching.
-    Returns the field type and appropriate emoji/formatting.
-    """
-    key_lower = key.lower()
+# Render a station's update message (shared by broadcast, /rf and /subscribe)
+def format_table_data(table_data, suffix=None):
+    return rendered_messages.render(table_data, suffix)
 
-    # Location matching (AWS Location, Location, Station Location, etc.)
-    if any(word in key_lower for word in ['location', 'station', 'site']):
-        return 'location', '📍'
 
-    # Mandal/Area matching
-    if any(word in key_lower
-           for word in ['mandal', 'area']):
-        return 'mandal', '🏘️'
+# Jittered backoff for stations that fail during a broadcast, one chain per station
+station_retries = RetryScheduler(attempts=config.RETRY_ATTEMPTS,
+                                 base_delay=config.RETRY_BASE_DELAY,
+                                 max_delay=config.RETRY_MAX_DELAY,
+                                 jitter=config.RETRY_JITTER)
 
-    # Last Updated matching - Check for "updated" or "last" specifically first
-    if any(word in key_lower for word in ['updated', 'last']):
-        return 'updated', '🕐'
+# Keep-alive HTTP sessions shared by every fetch path (direct and per proxy)
+http_pool = HttpPool(pool_size=config.HTTP_POOL_SIZE,
+                     idle_timeout=config.HTTP_POOL_IDLE_TIMEOUT,
+                     keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT)
 
-    # Date matching - Check for "date" fields (including "Date & Time")
-    if any(word in key_lower for word in ['date', 'day']):
-        return 'date', '📅'
+# MongoDB connection (already checked by required_env_vars)
 
-    # Generic time matching - only if not caught by above
-    if 'time' in key_lower and not any(
-            word in key_lower for word in ['date', 'updated', 'last']):
-        return 'updated', '🕐'
 
-    # Rainfall matching
-    if any(word in key_lower
-           for word in ['rainfall', 'rain']):
-        return 'rainfall', '🌧️'
+# Initialize MongoDB client
+mongo_client = None
+db = None
 
-    # Temperature matching
-    if any(word in key_lower
-           for word in ['temperature', 'temp']):
-        return 'temperature', '🌡️'
+# In-memory subscription index, created once MongoDB is connected
+subscription_store = None
 
-    # Humidity matching
-    if any(word in key_lower for word in ['humidity', 'rh']):
-        return 'humidity', '💧'
+# In-memory proxy list, created once MongoDB is connected
+proxy_registry = None
 
-    # Wind matching
-    if any(word in key_lower for word in ['wind', 'breeze']):
-        return 'wind', '🌬️'
+# Per-user delivery preferences (digest mode), created once MongoDB is connected
+user_settings = None
 
-    # Pressure matching
-    if any(word in key_lower for word in ['pressure', 'barometric']):
-        return 'pressure', '📊'
+# Last delivered reading per station, created once MongoDB is connected
+station_fingerprints = None
 
-    # Default
-    return 'other', ''
+# Learned publish time per station, created once MongoDB is connected
+publish_times = None
 
 
-# Fetch table data from URL with direct request (no proxy)
-def fetch_table_data_direct(url):
+def init_mongodb():
+    global mongo_client, db, subscription_store, proxy_registry, user_settings, station_fingerprints, publish_times
     try:
-        response = requests.get(url, timeout=10)
-        html = response.text
-
-        # Check for invalid range error
-        if "Invalid Range" in html:
-            return None, "Invalid station ID - station does not exist"
-
-        table_start = html.find('<table')
-        table_end = html.find('</table>') + len('</table>')
-        if table_start == -1 or table_end == -1:
-            return None, "Table not found in HTML"
-
-        table_html = html[table_start:table_end]
-        rows = [
-            row.strip() for row in table_html.split('<tr>')[1:]
-            if '</tr>' in row
-        ]
-        table_data = []
-
-        for row in rows:
-            cells = [
-                cell.strip() for cell in row.split('<td>')[1:]
-                if '</td>' in cell
-            ]
-            if len(cells) >= 2:
-                key = cells[0].split('</td>')[0].replace(
-                    '<span class="style46">', '').replace('</span>',
-                                                          '').strip()
-                value = cells[1].split('</td>')[0]
-                while '<' in value and '>' in value:
-                    start = value.find('<')
-                    end = value.find('>', start) + 1
-                    if end == 0:
-                        break
-                    value = value[:start] + value[end:]
-                value = value.strip()
-
-                # Skip Latitude and Longitude entries
-                if key.lower() in ['latitude', 'longitude']:
-                    continue
-
-                table_data.append((key, value))
-
-        return table_data, None
-    except RequestException as e:
-        return None, str(e)
+        mongo_client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
+        # Test the connection
+        mongo_client.admin.command('ping')
+        db = mongo_client.weather_bot
 
+        subscription_store = SubscriptionStore(db.subscriptions, db.station_subscribers,
+                                               config.INDIAN_TIMEZONE)
+        subscription_store.ensure_indexes()
+        subscription_store.load()
+
+        proxy_registry = ProxyRegistry(db.proxies, config.INDIAN_TIMEZONE,
+                                       check_interval=config.PROXY_VERSION_CHECK_INTERVAL)
+        proxy_registry.load()
+        proxy_registry.watch()
+
+        proxy_health.load(db.proxy_health)
+
+        user_settings = UserSettingsStore(db.user_settings, config.INDIAN_TIMEZONE,
+                                          default_digest=config.DEFAULT_DIGEST_MODE)
+        user_settings.ensure_indexes()
+        user_settings.load()
+
+        station_fingerprints = FingerprintStore(db.station_fingerprints, config.INDIAN_TIMEZONE)
+        station_fingerprints.load()
+
+        publish_times = PublishTimeLearner(db.publish_times, config.INDIAN_TIMEZONE,
+                                           default_offset=config.TARGET_MINUTE * 60,
+                                           window=config.PUBLISH_SAMPLE_WINDOW,
+                                           min_samples=config.PUBLISH_MIN_SAMPLES,
+                                           margin=config.PUBLISH_MARGIN_SECONDS,
+                                           learn_upper_bounds=config.PREFETCH_LEAD_SECONDS > config.PUBLISH_MARGIN_SECONDS)
+        publish_times.load()
+        logs.write_log("INFO", "MongoDB connection established successfully")
+        return True
+    except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+        logs.write_log("ERROR", f"Failed to connect to MongoDB: {e}")
+        return False
 
-def fetch_table_data(url, proxy, scheme):
-    try:
-        proxy_url = f"{scheme}://{proxy.split(':')[0]}:{proxy.split(':')[1]}"
-        response = requests.get(url,
-                                proxies={
-                                    "http": proxy_url,
-                                    "https": proxy_url
-                                },
-                                timeout=10)
-        html = response.text
-
-        # Check for invalid range error
-        if "Invalid Range" in html:
-            return None, "Invalid station ID - station does not exist"
-
-        table_start = html.find('<table')
-        table_end = html.find('</table>') + len('</table>')
-        if table_start == -1 or table_end == -1:
-            return None, "Table not found in HTML"
-
-        table_html = html[table_start:table_end]
-        rows = [
-            row.strip() for row in table_html.split('<tr>')[1:]
-            if '</tr>' in row
-        ]
-        table_data = []
-
-        for row in rows:
-            cells = [
-                cell.strip() for cell in row.split('<td>')[1:]
-                if '</td>' in cell
-            ]
-            if len(cells) >= 2:
-                key = cells[0].split('</td>')[0].replace(
-                    '<span class="style46">', '').replace('</span>',
-                                                          '').strip()
-                value = cells[1].split('</td>')[0]
-                while '<' in value and '>' in value:
-                    start = value.find('<')
-                    end = value.find('>', start) + 1
-                    if end == 0:
-                        break
-                    value = value[:start] + value[end:]
-                value = value.strip()
-
-                # Skip Latitude and Longitude entries
-                if key.lower() in ['latitude', 'longitude']:
-                    continue
 
-                table_data.append((key, value))
+# Load subscriptions (served from the in-memory store, not MongoDB)
+def load_subscriptions():
+    if subscription_store is None:
+        logs.write_log("ERROR", "MongoDB not initialized")
+        return {}
+    return subscription_store.all()
 
-        return table_data, None
-    except (ProxyError, ConnectTimeout, RequestException) as e:
-        return None, str(e)
 
+# Load one user's subscriptions as {chat_id: [suffixes]} ({} if none)
+def load_user_subscriptions(chat_id):
+    if subscription_store is None:
+        logs.write_log("ERROR", "MongoDB not initialized")
+        return {}
+    suffixes = subscription_store.get(chat_id)
+    return {chat_id: suffixes} if suffixes else {}
 
-# Escape HTML special characters
-def escape_html(text):
-    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
+# Load {suffix: [chat_ids]} from the store's maintained reverse index
+def load_station_subscribers():
+    if subscription_store is None:
+        logs.write_log("ERROR", "MongoDB not initialized")
+        return {}
+    return subscription_store.station_subscribers()
 
-# Format table data for Telegram message with flexible field matching
-def format_table_data(table_data, suffix=None):
-    if not table_data:
-        return "No table data extracted"
-
-    message = "🌦️ <b>Weather Update</b>"
-    if suffix:
-        message += f" - Station {suffix}"
-    message += "\n\n"
-
-    for key, value in table_data:
-        # Escape HTML characters in key and value
-        key = escape_html(str(key))
-        value = escape_html(str(value))
-
-        # Get field type and emoji using flexible matching
-        field_type, emoji = match_field_type(key)
-
-        # Convert time format for updated fields
-        if field_type == 'updated' and ':' in value:
-            value = convert_to_12hour(value)
-
-        # Format based on field type
-        if field_type == 'location':
-            message += f"{emoji} <b>Location:</b> {value}\n"
-        elif field_type == 'mandal':
-            message += f"{emoji} <b>Mandal:</b> {value}\n"
-        elif field_type == 'date':
-            message += f"{emoji} <b>Date:</b> {value}\n"
-        elif field_type == 'updated':
-            message += f"{emoji} <b>Last Updated:</b> {value}\n"
-        elif field_type == 'rainfall':
-            message += f"{emoji} <b>{key}:</b> {value}\n"
-        elif field_type == 'temperature':
-            # Add °C if not present and value is numeric
-            if value.replace('.', '').replace(
-                    '-', '').isdigit() and '°' not in value:
-                message += f"{emoji} <b>{key}:</b> {value}°C\n"
-            else:
-                message += f"{emoji} <b>{key}:</b> {value}\n"
-        elif field_type == 'humidity':
-            message += f"{emoji} <b>{key}:</b> {value}\n"
-        elif field_type == 'wind':
-            message += f"{emoji} <b>{key}:</b> {value}\n"
-        elif field_type == 'pressure':
-            message += f"{emoji} <b>{key}:</b> {value}\n"
-        else:
-            # Use emoji if available, otherwise just bold formatting
-            if emoji:
-                message += f"{emoji} <b>{key}:</b> {value}\n"
-            else:
-                message += f"<b>{key}:</b> {value}\n"
 
-    return message
+# Load proxies (served from the in-memory registry, not MongoDB)
+def load_proxies():
+    if proxy_registry is None:
+        logs.write_log("ERROR", "MongoDB not initialized")
+        return {"proxies": []}
+    return {"proxies": proxy_registry.get()}
 
 
-# Check proxies and fetch data for a user
-def check_proxies_and_fetch(url,
-                            chat_id,
-                            message_id=None,
-                            is_manual=False,
-                            suffix=None):
-    logs.write_log("INFO", f"=== Starting data fetch ===")
-    logs.write_log("INFO", f"Connection priority configured: {config.CONNECTION_PRIORITY}")
+# Return the configured proxy list, or [] when none are usable
+def get_valid_proxies():
     proxies_data = load_proxies()
-    valid_proxies_available = False
-    
-    if proxies_data and "proxies" in proxies_data and isinstance(proxies_data["proxies"], list) and proxies_data["proxies"]:
-        valid_proxies_available = True
-        logs.write_log("INFO", f"Valid proxies available: {len(proxies_data['proxies'])}")
-    else:
-        logs.write_log("INFO", "No valid proxies available")
+    if proxies_data and isinstance(proxies_data.get("proxies"), list):
+        return proxies_data["proxies"]
+    return []
 
-    # Send acknowledgment message for manual fetch
-    if is_manual and not message_id:
-        ack_msg = bot.send_message(chat_id,
-                                   "🔄 Fetching latest weather data...")
-        message_id = ack_msg.message_id
 
-    # Check if we should try direct first
-    if config.CONNECTION_PRIORITY == "direct":
-        logs.write_log("INFO", "Trying direct request first (as per config.CONNECTION_PRIORITY)")
-        table_data, error = fetch_table_data_direct(url)
-        if table_data:
-            formatted_data = format_table_data(table_data, suffix)
-            if message_id:
-                try:
-                    bot.edit_message_text(formatted_data,
-                                          chat_id,
-                                          message_id,
-                                          parse_mode='HTML')
-                except Exception as e:
-                    bot.send_message(chat_id,
-                                     formatted_data,
-                                     parse_mode='HTML')
+# Save proxies to MongoDB; the registry bumps the version so other instances reload
+def save_proxies(proxies_data):
+    if proxy_registry is None:
+        logs.write_log("ERROR", "MongoDB not initialized")
+        return
+    if proxy_registry.save(proxies_data.get('proxies', [])):
+        logs.write_log("INFO", f"Proxies saved to MongoDB successfully (version {proxy_registry.version()})")
+
+
+# True if the user wants all their stations in one digest message
+def wants_digest(chat_id):
+    return user_settings is not None and user_settings.digest(chat_id)
+
+
+# Cut text longer than the limit at line breaks (or mid-line as a last resort)
+def split_long_text(text, limit):
+    if len(text) <= limit:
+        return [text]
+    pieces = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+# Combine per-station blocks into as few messages as Telegram's length limit allows
+def build_digest_messages(blocks, limit=TELEGRAM_MESSAGE_LIMIT):
+    messages = []
+    current = ""
+    for block in blocks:
+        for piece in split_long_text(block, limit):
+            candidate = f"{current}\n{piece}" if current else piece
+            if len(candidate) > limit:
+                messages.append(current)
+                current = piece
             else:
-                bot.send_message(chat_id, formatted_data, parse_mode='HTML')
-            logs.write_log("INFO", "Direct request SUCCESS (first attempt)")
-            return True
-        else:
-            logs.write_log("ERROR", f"Direct request failed: {error}")
-            if not valid_proxies_available:
-                return False
-            logs.write_log("INFO", "Falling back to proxies")
-
-    # Try proxies (either first or as fallback)
-    if valid_proxies_available:
-        proxies = proxies_data["proxies"]
-        for proxy_entry in proxies:
+                current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+# Collects the station blocks of digest-mode subscribers during one broadcast
+# and sends each of them one message as soon as all their stations are done
+class BroadcastDigest:
+    def __init__(self, station_subscribers):
+        self.pending = {}  # chat_id -> suffixes still being fetched
+        self.blocks = {}   # chat_id -> {suffix: formatted block}
+        for suffix, chat_ids in station_subscribers.items():
+            for chat_id in chat_ids:
+                if wants_digest(chat_id):
+                    self.pending.setdefault(chat_id, set()).add(suffix)
+        self.members = set(self.pending)
+        self.messages_sent = 0
+
+    def wants(self, chat_id):
+        return chat_id in self.members
+
+    async def station_done(self, suffix, chat_ids, formatted_data):
+        ready = []
+        for chat_id in chat_ids:
+            remaining = self.pending.get(chat_id)
+            if remaining is None:
+                continue
+            if formatted_data:
+                self.blocks.setdefault(chat_id, {})[suffix] = formatted_data
+            remaining.discard(suffix)
+            if not remaining:
+                del self.pending[chat_id]
+                ready.append(chat_id)
+        await asyncio.gather(*(self.send(chat_id) for chat_id in ready))
+
+    async def send(self, chat_id):
+        blocks = self.blocks.pop(chat_id, {})
+        if not blocks:
+            return
+        # Keep the user's own subscription order
+        order = subscription_store.get(chat_id) if subscription_store is not None else []
+        suffixes = [suffix for suffix in order if suffix in blocks]
+        suffixes += [suffix for suffix in blocks if suffix not in suffixes]
+        for text in build_digest_messages([blocks[suffix] for suffix in suffixes]):
             try:
-                if ':' not in proxy_entry:
-                    logs.write_log("ERROR", f"Invalid proxy format: {proxy_entry}")
-                    continue
-
-                proxy, scheme = proxy_entry.rsplit(':', 1)
-                table_data, error = fetch_table_data(url, proxy, scheme)
-
-                if table_data:
-                    formatted_data = format_table_data(table_data, suffix)
-                    if message_id:
-                        try:
-                            bot.edit_message_text(formatted_data,
-                                                  chat_id,
-                                                  message_id,
-                                                  parse_mode='HTML')
-                        except Exception as e:
-                            bot.send_message(chat_id,
-                                             formatted_data,
-                                             parse_mode='HTML')
-                    else:
-                        bot.send_message(chat_id,
-                                         formatted_data,
-                                         parse_mode='HTML')
-                    logs.write_log("INFO", f"Proxy {proxy} ({scheme}) SUCCESS")
-                    return True
-                else:
-                    logs.write_log("ERROR", f"Proxy {proxy} ({scheme}) failed: {error}")
+                await bot.send_message_async(chat_id, text, parse_mode='HTML')
+                self.messages_sent += 1
+                event_log.record("send", station="digest", chat_id=chat_id, outcome="ok")
             except Exception as e:
-                logs.write_log("ERROR", f"Error processing proxy {proxy_entry}: {e}")
-                continue
+                logs.write_log("ERROR", f"Error sending digest to user {chat_id}: {e}")
+                event_log.record("send", station="digest", chat_id=chat_id, outcome="error", error=str(e))
 
-    # If proxy first and proxies failed, or direct first and we haven't tried direct yet
-    if config.CONNECTION_PRIORITY == "proxy":
-        logs.write_log("INFO",
-                  "All proxies failed, attempting direct request as fallback")
-        table_data, error = fetch_table_data_direct(url)
+    async def flush(self):
+        """Send whatever was collected for users whose stations didn't all finish"""
+        self.pending.clear()
+        await asyncio.gather(*(self.send(chat_id) for chat_id in list(self.blocks)))
 
-        if table_data:
-            formatted_data = format_table_data(table_data, suffix)
-            if message_id:
-                try:
-                    bot.edit_message_text(formatted_data,
-                                          chat_id,
-                                          message_id,
-                                          parse_mode='HTML')
-                except Exception as e:
-                    bot.send_message(chat_id,
-                                     formatted_data,
-                                     parse_mode='HTML')
-            else:
-                bot.send_message(chat_id, formatted_data, parse_mode='HTML')
-            logs.write_log("INFO", "Direct request SUCCESS (fallback)")
+
+# Queue the same formatted station message for every subscriber; the delivery
+# queue paces the sends
+async def send_station_update_async(suffix, formatted_data, chat_ids):
+    async def send(chat_id):
+        try:
+            await bot.send_message_async(chat_id, formatted_data, parse_mode='HTML')
+            event_log.record("send", station=suffix, chat_id=chat_id, outcome="ok")
             return True
-        else:
-            logs.write_log("ERROR", f"Direct request also failed: {error}")
+        except Exception as e:
+            logs.write_log("ERROR", f"Error sending station {suffix} update to user {chat_id}: {e}")
+            event_log.record("send", station=suffix, chat_id=chat_id, outcome="error", error=str(e))
             return False
 
-    return False
+    sent = sum(await asyncio.gather(*(send(chat_id) for chat_id in chat_ids)))
+    logs.write_log("INFO", f"Station {suffix} update sent to {sent}/{len(chat_ids)} subscriber(s)")
+    return sent
 
 
-def check_indian_time_and_update():
-    try:
-        # Get current time in Indian timezone
-        indian_time = datetime.now(config.INDIAN_TIMEZONE)
-        current_minute = indian_time.minute
-
-        # Replace the last checking time log instead of appending
-        logs.replace_last_checking_log(
-            f"Checking Indian time: {indian_time.strftime('%Y-%m-%d %H:%M:%S IST')}, minute: {current_minute}"
-        )
-
-        if current_minute == config.TARGET_MINUTE:
-            logs.write_log(
-                "INFO",
-                f"Indian time minute is {config.TARGET_MINUTE}, running automatic /rf command")
-            subscriptions = load_subscriptions()
-
-            if not subscriptions:  
-                logs.write_log("INFO",
-                          "No subscriptions found for automatic update")
-                return
+# Stations whose update hasn't been delivered this hour (unchanged upstream
+# data or failed fetches), re-checked in config.RETRY_MINUTES. Only touched
+# from the engine loop.
+deferred_stations = set()
 
-            for chat_id, suffixes in subscriptions.items():
-                try:
-                    # Handle both old format (string) and new format (list)
-                    if isinstance(suffixes, str):
-                        suffixes = [suffixes]
-
-                    logs.write_log(
-                        "INFO",
-                        f"Running automatic /rf for user {chat_id} with {len(suffixes)} subscription(s)"
-                    )
-
-                    all_failed = True  # Assume all requests will fail initially
-
-                    # Use the multi-station concurrent function for faster processing
-                    if len(suffixes) > 1:
-                        # Process all stations concurrently
-                        if fetch_multiple_stations_concurrent(chat_id, suffixes):
-                            all_failed = False  # At least one request succeeded
-                    else:
-                        # For a single subscription, use the regular concurrent function
-                        url = f"{config.URL_PREFIX}{suffixes[0]}"
-                        if check_proxies_and_fetch_concurrent(url, chat_id, suffix=suffixes[0]):
-                            all_failed = False  # At least one request succeeded
-
-                    # Retry mechanism for proxy failures
-                    if all_failed:
-                        logs.write_log(
-                            "INFO",
-                            f"All proxies and direct connection failed at {config.TARGET_MINUTE} minutes, implementing proxy retry mechanism"
-                        )
-                        
-                        # Reload proxies to get any updated ones
-                        proxies_data = load_proxies()
-                        if proxies_data and "proxies" in proxies_data and isinstance(
-                                proxies_data["proxies"], list) and proxies_data["proxies"]:
-                            
-                            # Try up to 3 times with exponential backoff, but only with proxies
-                            for retry_attempt in range(3):
-                                # Calculate backoff time: 10, 20, 40 seconds
-                                backoff_time = 10 * (2 ** retry_attempt)
-                                logs.write_log("INFO", f"Proxy retry attempt {retry_attempt+1}/3 after {backoff_time} seconds")
-                                time.sleep(backoff_time)
-                                
-                                # Use the async functions to retry with proxies only
-                                retry_success = False
-                                loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(loop)
-                                
-                                try:
-                                    if len(suffixes) > 1:
-                                        # For multiple stations, prepare URLs dictionary
-                                        urls = {suffix: f"{config.URL_PREFIX}{suffix}" for suffix in suffixes}
-                                        results = loop.run_until_complete(
-                                            fetch_multiple_urls_async(urls, proxies_data["proxies"]))
-                                        
-                                        # Process results
-                                        success_count = 0
-                                        for suffix, (table_data, result) in results.items():
-                                            if table_data:
-                                                formatted_data = format_table_data(table_data, suffix)
-                                                bot.send_message(chat_id, formatted_data, parse_mode='HTML')
-                                                logs.write_log("INFO", f"Proxy {result} SUCCESS for station {suffix} (retry {retry_attempt+1})")
-                                                success_count += 1
-                                        
-                                        retry_success = success_count > 0
-                                    else:
-                                        # For a single subscription
-                                        url = f"{config.URL_PREFIX}{suffixes[0]}"
-                                        table_data, result = loop.run_until_complete(
-                                            fetch_with_proxies_async(url, proxies_data["proxies"]))
-                                        
-                                        if table_data:
-                                            formatted_data = format_table_data(table_data, suffixes[0])
-                                            bot.send_message(chat_id, formatted_data, parse_mode='HTML')
-                                            logs.write_log("INFO", f"Proxy {result} SUCCESS (retry {retry_attempt+1})")
-                                            retry_success = True
-                                except Exception as e:
-                                    logs.write_log("ERROR", f"Error in proxy retry attempt {retry_attempt+1}: {e}")
-                                finally:
-                                    loop.close()
-                                
-                                # If successful, break out of retry loop
-                                if retry_success:
-                                    logs.write_log("INFO", f"Proxy retry attempt {retry_attempt+1} succeeded")
-                                    break
-                                elif retry_attempt == 2:  # Last attempt
-                                    logs.write_log("INFO", "All proxy retry attempts failed")
-                        else:
-                            logs.write_log("INFO", "No valid proxies available for retry")
-                        
-                        # Also check at specific minutes as a fallback
-                        indian_time = datetime.now(config.INDIAN_TIMEZONE)
-                        if indian_time.minute in config.RETRY_MINUTES:
-                            logs.write_log("INFO", f"Additional retry at minute {indian_time.minute}")
-                            # Use the multi-station concurrent function for retry
-                            if len(suffixes) > 1:
-                                # Process all stations concurrently
-                                fetch_multiple_stations_concurrent(chat_id, suffixes)
-                            else:
-                                # For a single subscription, use the regular concurrent function
-                                url = f"{config.URL_PREFIX}{suffixes[0]}"
-                                check_proxies_and_fetch_concurrent(url, chat_id, suffix=suffixes[0])
-
-                except Exception as e:
-                    logs.write_log(
-                        "ERROR",
-                        f"Error in automatic update for user {chat_id}: {e}")
-                    # Continue with next user even if one fails
-                    continue
 
-            logs.write_log("INFO", "Completed automatic /rf command for all users")
+# Fetch one station for the broadcast, retrying with backoff without holding up
+# the other stations, then fan it out to its subscribers
+async def broadcast_station_async(suffix, chat_ids, proxies, digest):
+    url = f"{config.URL_PREFIX}{suffix}"
+    table_data, result = await get_station_async(suffix, proxies)
 
-    except Exception as e:
-        logs.write_log("ERROR", f"Error in check_indian_time_and_update: {e}")
+    # Retry with jittered backoff while the other stations carry on; every
+    # caller waiting on this station shares one retry chain (a station that
+    # doesn't exist isn't retried)
+    if not is_final_result(table_data, result) and proxies:
+        logs.write_log("INFO", f"Station {suffix} failed at {config.TARGET_MINUTE} minutes, queueing for retry")
+        table_data, result = await station_retries.retry(
+            f"station {suffix}",
+            lambda: fetch_with_proxies_async(url, proxies),
+            lambda outcome: is_final_result(*outcome))
+        if table_data:
+            logs.write_log("INFO", f"Proxy {result} SUCCESS for station {suffix} after retry")
+            station_cache.put(suffix, table_data, result)
+
+    if not table_data:
+        logs.write_log("ERROR", f"All methods failed for station {suffix}: {result}")
+        await digest.station_done(suffix, chat_ids, None)
+        # Try again in the retry minutes, unless the station doesn't exist
+        if not is_final_result(table_data, result):
+            deferred_stations.add(suffix)
+            return None
+        return False
 
+    await observe_publish_time(suffix, table_data, result)
+
+    # Same reading as the last one delivered: the upstream hasn't published
+    # yet, so nothing is sent now and the station is re-checked later
+    fingerprint = station_fingerprint(table_data)
+    if station_fingerprints is not None and station_fingerprints.unchanged(suffix, fingerprint):
+        logs.write_log("INFO", f"Station {suffix} unchanged since last delivery, deferring to retry minutes")
+        # The re-check has to go back upstream, not get this copy from the cache
+        station_cache.invalidate(suffix)
+        deferred_stations.add(suffix)
+        await digest.station_done(suffix, chat_ids, None)
+        return None
+
+    logs.write_log("INFO", f"Station {suffix} fetched via {result}")
+    formatted_data = format_table_data(table_data, suffix)
+    # Digest users get this block in their combined message instead
+    direct_chat_ids = [chat_id for chat_id in chat_ids if not digest.wants(chat_id)]
+    await asyncio.gather(
+        send_station_update_async(suffix, formatted_data, direct_chat_ids),
+        digest.station_done(suffix, chat_ids, formatted_data))
+    if station_fingerprints is not None:
+        await asyncio.to_thread(station_fingerprints.record, suffix, fingerprint)
+    # Last hour's reading went out late: re-check in the retry minutes for
+    # this hour's, or the station stays an hour behind from now on
+    if reading_is_behind(table_data):
+        deferred_stations.add(suffix)
+    return True
+
+
+# broadcast_station_async results as event outcomes
+BROADCAST_OUTCOMES = {True: "delivered", None: "deferred", False: "invalid"}
+
+
+# Run the hourly broadcast: every unique station is fetched once, all stations
+# in parallel, and each result is fanned out as soon as it arrives. With
+# hour_top, each station waits for its own time in that hour first.
+async def run_broadcast_async(station_subscribers, recheck=False, hour_top=None):
+    started = time.monotonic()
+    if not recheck:
+        # A new hour starts with nothing deferred
+        deferred_stations.clear()
+    total_subscriptions = sum(len(chat_ids) for chat_ids in station_subscribers.values())
+    unique_stations = len(station_subscribers)
+    dedup_ratio = total_subscriptions / unique_stations if unique_stations else 0
+    logs.write_log(
+        "INFO",
+        f"Broadcast plan: {total_subscriptions} subscription(s) "
+        f"across {unique_stations} unique station(s), dedup ratio {dedup_ratio:.2f}x")
+
+    proxies = await asyncio.to_thread(get_valid_proxies)
+    digest = BroadcastDigest(station_subscribers)
+    if hour_top is None:
+        jobs = [broadcast_station_async(suffix, chat_ids, proxies, digest)
+                for suffix, chat_ids in station_subscribers.items()]
+    else:
+        jobs = [scheduled_station_async(suffix, chat_ids, proxies, digest, hour_top)
+                for suffix, chat_ids in station_subscribers.items()]
+    delivered = await asyncio.gather(*jobs, return_exceptions=True)
+    await digest.flush()
+    if digest.members:
+        logs.write_log("INFO", f"Sent {digest.messages_sent} digest message(s) to {len(digest.members)} digest user(s)")
+
+    for suffix, outcome in zip(station_subscribers, delivered):
+        if isinstance(outcome, Exception):
+            logs.write_log("ERROR", f"Error in automatic update for station {suffix}: {outcome}")
+        event_log.record("broadcast", station=suffix,
+                         subscribers=len(station_subscribers[suffix]), recheck=recheck,
+                         outcome=BROADCAST_OUTCOMES.get(outcome, "error"),
+                         error=str(outcome) if isinstance(outcome, Exception) else None)
+    delivered_count = sum(1 for outcome in delivered if outcome is True)
+    deferred_count = sum(1 for outcome in delivered if outcome is None)
+    await asyncio.to_thread(flush_proxy_health, True)
 
-# Run Indian time checker in a separate thread
-def run_indian_time_checker():
     logs.write_log(
         "INFO",
-        f"Starting Indian time checker - checking every minute for minute {config.TARGET_MINUTE}")
+        f"Completed automatic /rf command for all users in {time.monotonic() - started:.1f}s: "
+        f"{delivered_count}/{unique_stations} station(s) delivered, {deferred_count} deferred, "
+        f"with {unique_stations} upstream fetch(es) instead of {total_subscriptions}")
+    summary = f"{delivered_count}/{unique_stations} station(s) delivered, {deferred_count} deferred"
+    if recheck:
+        status_board.set(last_recheck=datetime.now(config.INDIAN_TIMEZONE), last_recheck_result=summary)
+        status_board.event("recheck", summary)
+    else:
+        status_board.set(last_broadcast=datetime.now(config.INDIAN_TIMEZONE), last_broadcast_result=summary)
+        status_board.event("broadcast", summary)
+    return delivered_count
+
+
+# Re-check the stations deferred by this hour's broadcast; after the last
+# retry minute, stations that still have nothing new are dropped until next hour
+async def run_deferred_recheck_async(final=False):
+    if not deferred_stations:
+        return 0
+    station_subscribers = {}
+    for suffix in deferred_stations:
+        chat_ids = subscription_store.subscribers(suffix) if subscription_store is not None else []
+        if chat_ids:
+            station_subscribers[suffix] = chat_ids
+    deferred_stations.clear()
+    if not station_subscribers:
+        return 0
+
+    logs.write_log("INFO", f"Re-checking {len(station_subscribers)} deferred station(s): {', '.join(station_subscribers)}")
+    delivered_count = await run_broadcast_async(station_subscribers, recheck=True)
+    if final and deferred_stations:
+        logs.write_log("INFO", f"No new data after the last retry minute for {len(deferred_stations)} station(s): {', '.join(sorted(deferred_stations))}")
+        deferred_stations.clear()
+    return delivered_count
+
+
+# Seconds after the top of the hour a station's new reading is expected: its
+# learned publish time, or None while it is still being learned
+def station_publish_offset(suffix):
+    if publish_times is None:
+        return None
+    return publish_times.p95(suffix)
+
+
+# Seconds after the top of the hour to broadcast a station at: its learned
+# publish time when there is one, otherwise config.TARGET_MINUTE
+def station_fire_offset(suffix):
+    if publish_times is None:
+        return config.TARGET_MINUTE * 60
+    return publish_times.fire_offset(suffix)
+
+
+# Feed a scheduled fetch of a station to the publish-time learner. Only
+# readings fetched from the upstream count: `source` is "cache" for a cached
+# copy, which says nothing about when the station published.
+async def observe_publish_time(suffix, table_data, source, first_poll=False):
+    if publish_times is not None and table_data and source != "cache":
+        await asyncio.to_thread(publish_times.observe, suffix, table_data, first_poll=first_poll)
+
+
+# Sleep on the engine loop until the given IST time (returns at once if it passed)
+async def sleep_until_async(when):
+    delay = (when - datetime.now(config.INDIAN_TIMEZONE)).total_seconds()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+# True if a station's reading is stamped before the current hour: last hour's
+# data, with this hour's still to come (False when it has no readable stamp)
+def reading_is_behind(table_data):
+    reading = parse_last_updated(find_last_updated(table_data), config.INDIAN_TIMEZONE)
+    if reading is None:
+        return False
+    now = datetime.now(config.INDIAN_TIMEZONE)
+    return reading < now.replace(minute=0, second=0, microsecond=0)
+
+
+# Pre-fetch one station into the cache; True once the cached data is new since
+# the last delivery, False if it's still the old reading or the fetch failed,
+# and None for a station that doesn't exist
+async def prefetch_station_async(suffix, proxies, repoll=False):
+    # Every poll goes to the upstream: the cached copy is last hour's reading,
+    # still fresh by its TTL until the fire time. The fetch refills the cache.
+    station_cache.invalidate(suffix)
+    table_data, result = await get_station_async(suffix, proxies)
+    if not table_data:
+        return None if is_final_result(table_data, result) else False
+    await observe_publish_time(suffix, table_data, result, first_poll=not repoll)
+    # Last hour's reading isn't what the pre-fetch waits for, even if it
+    # was never delivered
+    if reading_is_behind(table_data):
+        return False
+    if station_fingerprints is None:
+        return True
+    return not station_fingerprints.unchanged(suffix, station_fingerprint(table_data))
+
+
+# Pre-fetch a station, polling again every poll_interval seconds while its
+# data hasn't updated, until `deadline`; a reading that is still stale is
+# dropped from the cache so the broadcast doesn't fan out the old copy
+async def prefetch_station_until_async(suffix, proxies, deadline, poll_interval):
+    repoll = False
+    polls = 0
     while True:
+        polls += 1
         try:
-            check_indian_time_and_update()
-            time.sleep(60)  # Check every minute
+            fresh = await prefetch_station_async(suffix, proxies, repoll)
         except Exception as e:
-            logs.write_log("ERROR", f"Indian time checker error: {e}")
-            time.sleep(60)  # Continue running even if there's an error
+            logs.write_log("ERROR", f"Pre-fetch error for station {suffix}: {e}")
+            fresh = False
+        remaining = (deadline - datetime.now(config.INDIAN_TIMEZONE)).total_seconds()
+        if fresh is not False or remaining <= poll_interval:
+            break
+        await asyncio.sleep(poll_interval)
+        repoll = True
+
+    if fresh is False:
+        station_cache.invalidate(suffix)
+        logs.write_log("INFO", f"Station {suffix} still stale after {polls} pre-fetch poll(s)")
+    elif fresh:
+        logs.write_log("INFO", f"Station {suffix} pre-fetched after {polls} poll(s)")
+    return fresh
+
+
+# Broadcast one station at its own time in the hour: pre-fetched from
+# PREFETCH_LEAD_SECONDS before that time until its data is new, so at the
+# time itself the broadcast is mostly fan-out from the cache
+async def scheduled_station_async(suffix, chat_ids, proxies, digest, hour_top):
+    fire_at = hour_top + timedelta(seconds=station_fire_offset(suffix))
+    if config.PREFETCH_LEAD_SECONDS:
+        await sleep_until_async(fire_at - timedelta(seconds=config.PREFETCH_LEAD_SECONDS))
+        await prefetch_station_until_async(suffix, proxies, fire_at, config.PREFETCH_POLL_INTERVAL)
+    await sleep_until_async(fire_at)
+    return await broadcast_station_async(suffix, chat_ids, proxies, digest)
+
+
+# Run the broadcast for one hour; every station goes out at its own time in it
+async def run_hourly_broadcast_async(hour_top):
+    logs.write_log(
+        "INFO",
+        f"Running automatic /rf command for {hour_top.strftime('%H:00')} "
+        f"(default minute {config.TARGET_MINUTE})")
+    station_subscribers = await asyncio.to_thread(load_station_subscribers)
+
+    if not station_subscribers:
+        logs.write_log("INFO",
+                  "No subscriptions found for automatic update")
+        return 0
+
+    return await run_broadcast_async(station_subscribers, hour_top=hour_top)
+
+
+# Schedules the hourly broadcast in INDIAN_TIMEZONE and the RETRY_MINUTES
+# re-checks as follow-ups of the same hour. The hour's job starts
+# PREFETCH_LEAD_SECONDS before its earliest station is due (each station at
+# its learned publish time, or TARGET_MINUTE). Every job is claimed in MongoDB
+# first, so each runs at most once per hour even when the bot is restarted or
+# another node takes over mid-hour.
+class BroadcastScheduler:
+    def __init__(self, tz, target_minute, retry_minutes, prefetch_lead=0):
+        self.tz = tz
+        self.target_minute = target_minute
+        self.retry_minutes = sorted(minute for minute in retry_minutes if minute > target_minute)
+        self.prefetch_lead = prefetch_lead
+        self.stop_event = threading.Event()
+        self.next_fire_at = None
+        self.last_fired_at = None
+        self.claimed_locally = set()
+
+    def due_offsets(self):
+        """Seconds after the top of the hour each subscribed station is due at"""
+        suffixes = subscription_store.station_subscribers() if subscription_store is not None else {}
+        return [station_fire_offset(suffix) for suffix in suffixes] or [self.target_minute * 60]
+
+    def next_fire(self, now):
+        """Start of the next hourly job, PREFETCH_LEAD_SECONDS before the first
+        station is due; an hour whose window is still open (up to the last
+        retry minute or the last station due, whichever is later) fires
+        immediately"""
+        due = self.due_offsets()
+        hour_top = now.replace(minute=0, second=0, microsecond=0)
+        fire_at = hour_top + timedelta(seconds=max(0, min(due) - self.prefetch_lead))
+        last_retry = (self.retry_minutes[-1] if self.retry_minutes else self.target_minute) * 60 + 59
+        window_end = hour_top + timedelta(seconds=max(last_retry, max(due)))
+        if fire_at <= now <= window_end and hour_top != self.last_fired_at:
+            return now
+        if fire_at <= now:
+            fire_at += timedelta(hours=1)
+        return fire_at
+
+    def claim(self, job_id):
+        """True if this process may run the job; False if it already ran somewhere"""
+        if db is None:
+            if job_id in self.claimed_locally:
+                return False
+            self.claimed_locally.add(job_id)
+            return True
+        try:
+            db.scheduler_runs.insert_one({
+                '_id': job_id,
+                'claimed_at': datetime.now(self.tz),
+                'pid': os.getpid(),
+                'host': platform.node()
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            # Better to risk a duplicate than to skip the hour entirely
+            logs.write_log("ERROR", f"Could not claim scheduler job {job_id}, running anyway: {e}")
+            return True
+
+    async def run_hour_async(self, hour_top):
+        hour_key = hour_top.strftime('%Y-%m-%dT%H')
+        if not await asyncio.to_thread(self.claim, f"broadcast:{hour_key}"):
+            logs.write_log("INFO", f"Broadcast for {hour_key} already ran, skipping")
+            return
+        # Stations go out at their own times, so the re-checks run alongside
+        # the broadcast for the stations it has already deferred
+        broadcast = asyncio.ensure_future(run_hourly_broadcast_async(hour_top))
+
+        # Follow-up re-checks, each at its own minute of the same hour; minutes
+        # that passed while the broadcast ran collapse into one re-check
+        for index, minute in enumerate(self.retry_minutes):
+            final = index == len(self.retry_minutes) - 1
+            if final:
+                # The last re-check also covers the stations due latest
+                await asyncio.wait([broadcast])
+            fire_at = hour_top.replace(minute=minute)
+            delay = (fire_at - datetime.now(self.tz)).total_seconds()
+            if not final and delay < 0:
+                following = hour_top.replace(minute=self.retry_minutes[index + 1])
+                if following <= datetime.now(self.tz):
+                    continue
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if await asyncio.to_thread(self.claim, f"recheck:{hour_key}:{minute:02d}"):
+                await run_deferred_recheck_async(final=final)
+        await broadcast
+
+    def run(self):
+        logs.write_log(
+            "INFO",
+            f"Starting broadcast scheduler for minute {self.target_minute} or each station's learned "
+            f"publish time (re-checks at {', '.join(map(str, self.retry_minutes))})")
+        if db is not None:
+            try:
+                # Claims are only needed for the current hour
+                db.scheduler_runs.create_index('claimed_at', expireAfterSeconds=2 * 24 * 3600)
+            except Exception as e:
+                logs.write_log("ERROR", f"Failed to create TTL index on scheduler_runs: {e}")
+
+        while not self.stop_event.is_set():
+            try:
+                now = datetime.now(self.tz)
+                self.next_fire_at = self.next_fire(now)
+                status_board.set(scheduler_tick=now, next_fire=self.next_fire_at)
+                logs.write_log("INFO", f"Next broadcast at {self.next_fire_at.strftime('%Y-%m-%d %H:%M:%S IST')}")
+                if not self.sleep_until(self.next_fire_at):
+                    break
+
+                hour_top = self.next_fire_at.replace(minute=0, second=0, microsecond=0)
+                self.last_fired_at = hour_top
+                # The hour's jobs run on the engine loop; the scheduler goes
+                # straight back to computing the next fire time
+                future = engine.submit(self.run_hour_async(hour_top))
+                future.add_done_callback(self._log_job_error)
+                status_board.event("scheduler", f"Started the {hour_top.strftime('%H:00')} broadcast")
+            except Exception as e:
+                logs.write_log("ERROR", f"Broadcast scheduler error: {e}")
+                status_board.event("error", f"Broadcast scheduler error: {e}")
+                self.stop_event.wait(60)
+
+    def sleep_until(self, when):
+        """Sleep until `when`, re-reading the clock after wake-ups so a long
+        sleep can't fire early or drift; False if the scheduler was stopped.
+        Each wake-up is a scheduler tick on the status board."""
+        delay = (when - datetime.now(self.tz)).total_seconds()
+        while delay > 0 and not self.stop_event.wait(min(delay, 60)):
+            now = datetime.now(self.tz)
+            status_board.set(scheduler_tick=now)
+            delay = (when - now).total_seconds()
+        return not self.stop_event.is_set()
+
+    def _log_job_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logs.write_log("ERROR", f"Error in scheduled broadcast job: {future.exception()}")
+
+    def stop(self):
+        self.stop_event.set()
+
+
+broadcast_scheduler = BroadcastScheduler(config.INDIAN_TIMEZONE,
+                                         config.TARGET_MINUTE,
+                                         config.RETRY_MINUTES,
+                                         prefetch_lead=config.PREFETCH_LEAD_SECONDS)
 
 
 # Command: /help - Show help text (different for users and owner)
@@ -695,10 +785,12 @@ def send_help(message):
 • <code>/list</code> - View your subscriptions with serial numbers
 • <code>/unsubscribe</code> serial_number  - Remove a subscription
 • <code>/rf</code> - Get latest weather data (manual refresh)
+• <code>/digest</code> on|off - Get all your stations in one message
 
 <b>Owner Commands:</b>
-• <code>/logs</code> - Download bot logs
+• <code>/logs</code> [6h|2d|date [date]] [level] - Download bot logs (default last 24h)
 • <code>/stats</code> - Show system stats
+• <code>/events</code> [hours] [type] [field=value] [by=field] - Query recent events
 • <code>/proxy_list</code> - View all proxies with serial numbers
 • <code>/update_proxy</code> ip:port:protocol - Add a new proxy
 • <code>/delete_proxy</code> serial_number - Remove a proxy
@@ -711,6 +803,8 @@ def send_help(message):
 • <code>/unsubscribe 1</code>
 • <code>/update_proxy 192.168.1.1:8080:http</code>
 • <code>/delete_proxy 1</code>
+• <code>/logs 2d error</code>
+• <code>/events 6 fetch outcome=error by=path</code>
 • <code>/modify_user add 123456789 1057,1058</code>
 
 <b>Limits:</b>
@@ -728,6 +822,7 @@ def send_help(message):
 • <code>/list</code> - View your subscriptions with serial numbers
 • <code>/unsubscribe</code> serial_number - Remove a subscription
 • <code>/rf</code> - Get latest weather data (manual refresh)
+• <code>/digest</code> on|off - Get all your stations in one message
 
 <b>Examples:</b>
 • <code>/subscribe</code>  1057
@@ -768,7 +863,7 @@ def subscribe(message):
                 parse_mode='HTML')
             return
 
-        subscriptions = load_subscriptions()
+        subscriptions = load_user_subscriptions(chat_id)
 
         # Initialize user subscriptions if not exists
         if chat_id not in subscriptions:
@@ -793,88 +888,19 @@ def subscribe(message):
                 parse_mode='HTML')
             return
 
-        url = f"{config.URL_PREFIX}{suffix}"
-
         # Send validation message
         val_msg = bot.reply_to(message,
                                f"🔄 <b>Validating station ID {suffix}...</b>",
                                parse_mode='HTML')
 
-        # Validate station before subscribing
-        proxies_data = load_proxies()
-        valid_proxies_available = False
-        if proxies_data and "proxies" in proxies_data and isinstance(proxies_data["proxies"], list) and proxies_data["proxies"]:
-            valid_proxies_available = True
-            
-        validation_success = False
-        validation_error = None
-
+        # Validate station before subscribing; a successful fetch is cached
+        # so the initial data shown below doesn't hit the upstream again
         logs.write_log("INFO", f"=== Starting station validation ===")
-        logs.write_log("INFO", f"Connection priority configured: {config.CONNECTION_PRIORITY}")
-        if valid_proxies_available:
-            logs.write_log("INFO", f"Valid proxies available: {len(proxies_data['proxies'])}")
-        else:
-            logs.write_log("INFO", "No valid proxies available")
-
-        # Try direct first if configured
-        if config.CONNECTION_PRIORITY == "direct":
-            logs.write_log("INFO", "Trying direct request first for station validation")
-            table_data, error = fetch_table_data_direct(url)
-            if table_data:
-                logs.write_log("INFO", "Direct request SUCCESS, station is valid")
-                validation_success = True
-            elif error and "Invalid station ID" in error:
-                validation_error = error
-            elif valid_proxies_available:
-                logs.write_log("INFO", "Direct failed, falling back to proxies for validation")
-                # Try proxies as fallback
-                for proxy_entry in proxies_data["proxies"]:
-                    try:
-                        if ':' not in proxy_entry:
-                            continue
-                        proxy, scheme = proxy_entry.rsplit(':', 1)
-                        logs.write_log("INFO", f"Trying proxy {proxy} ({scheme}) for station validation")
-                        table_data, error = fetch_table_data(url, proxy, scheme)
-                        if table_data:
-                            logs.write_log("INFO", f"Proxy {proxy} SUCCESS, station is valid")
-                            validation_success = True
-                            break
-                        elif error and "Invalid station ID" in error:
-                            validation_error = error
-                            break
-                    except:
-                        continue
-
-        # Try proxies first if configured
-        elif config.CONNECTION_PRIORITY == "proxy":
-            if valid_proxies_available:
-                logs.write_log("INFO", "Trying proxies first for station validation")
-                for proxy_entry in proxies_data["proxies"]:
-                    try:
-                        if ':' not in proxy_entry:
-                            continue
-                        proxy, scheme = proxy_entry.rsplit(':', 1)
-                        logs.write_log("INFO", f"Trying proxy {proxy} ({scheme}) for station validation")
-                        table_data, error = fetch_table_data(url, proxy, scheme)
-
-                        if table_data:
-                            validation_success = True
-                            break
-                        elif error and "Invalid station ID" in error:
-                            validation_error = error
-                            break
-                    except:
-                        continue
-
-            # Try direct request as fallback
-            if not validation_success and not validation_error:
-                logs.write_log("INFO", "All proxies failed for validation, trying direct request as fallback")
-                table_data, error = fetch_table_data_direct(url)
-                if table_data:
-                    logs.write_log("INFO", "Direct request SUCCESS, station is valid")
-                    validation_success = True
-                elif error and "Invalid station ID" in error:
-                    validation_error = error
+        table_data, validation_error = fetch_station(suffix)
+        validation_success = bool(table_data)
+        if validation_success:
+            logs.write_log("INFO", f"Station {suffix} is valid (via {validation_error})")
+            validation_error = None
 
         # Handle validation results
         if validation_error and "Invalid station ID" in validation_error:
@@ -894,8 +920,9 @@ def subscribe(message):
             return
 
         # Add subscription only after successful validation
+        if not subscription_store.add(chat_id, suffix):
+            raise RuntimeError(f"Failed to save subscription {suffix}")
         subscriptions[chat_id].append(suffix)
-        save_subscriptions(subscriptions)
         logs.write_log("INFO", f"{chat_id} subscribed to suffix {suffix}")
 
         # Update message with success and show data
@@ -906,8 +933,7 @@ def subscribe(message):
             parse_mode='HTML')
 
         # Fetch and display initial data using concurrent function
-        check_proxies_and_fetch_concurrent(url,
-                                chat_id,
+        check_proxies_and_fetch_concurrent(chat_id,
                                 val_msg.message_id,
                                 suffix=suffix)
 
@@ -927,7 +953,7 @@ def subscribe(message):
 def list_subscriptions(message):
     chat_id = str(message.chat.id)
     try:
-        subscriptions = load_subscriptions()
+        subscriptions = load_user_subscriptions(chat_id)
 
         if chat_id not in subscriptions or not subscriptions[chat_id]:
             bot.reply_to(
@@ -978,7 +1004,7 @@ def unsubscribe(message):
                 parse_mode='HTML')
             return
 
-        subscriptions = load_subscriptions()
+        subscriptions = load_user_subscriptions(chat_id)
 
         if chat_id not in subscriptions or not subscriptions[chat_id]:
             bot.reply_to(
@@ -1005,13 +1031,8 @@ def unsubscribe(message):
         # Remove subscription
         user_subs.remove(suffix_to_remove)
 
-        # Clean up empty subscription lists
-        if not user_subs:
-            del subscriptions[chat_id]
-        else:
-            subscriptions[chat_id] = user_subs
-
-        save_subscriptions(subscriptions)
+        if not subscription_store.remove(chat_id, suffix_to_remove):
+            raise RuntimeError(f"Failed to remove subscription {suffix_to_remove}")
         logs.write_log("INFO",
                   f"{chat_id} unsubscribed from suffix {suffix_to_remove}")
 
@@ -1037,7 +1058,7 @@ def unsubscribe(message):
 def manual_fetch(message):
     chat_id = str(message.chat.id)
     try:
-        subscriptions = load_subscriptions()
+        subscriptions = load_user_subscriptions(chat_id)
         if chat_id in subscriptions and subscriptions[chat_id]:
             user_subs = subscriptions[chat_id]
             if isinstance(user_subs, str):
@@ -1055,9 +1076,7 @@ def manual_fetch(message):
                 fetch_multiple_stations_concurrent(chat_id, user_subs)
             else:
                 # For a single subscription, use the regular concurrent function
-                url = f"{config.URL_PREFIX}{user_subs[0]}"
-                check_proxies_and_fetch_concurrent(url,
-                                        chat_id,
+                check_proxies_and_fetch_concurrent(chat_id,
                                         is_manual=True,
                                         suffix=user_subs[0])
         else:
@@ -1075,20 +1094,102 @@ def manual_fetch(message):
             pass
 
 
-# Command: /logs with error handling
+# Command: /digest [on|off] - Choose one combined message instead of one per station
+@bot.message_handler(commands=['digest'])
+def digest_mode(message):
+    chat_id = str(message.chat.id)
+    try:
+        if user_settings is None:
+            bot.reply_to(message, "❌ Settings are not available right now. Please try again later.")
+            return
+
+        parts = message.text.split()
+        if len(parts) < 2:
+            state = "ON" if user_settings.digest(chat_id) else "OFF"
+            bot.reply_to(
+                message,
+                f"📰 <b>Digest mode:</b> {state}\n\nWhen on, updates for all your stations arrive in one message.\n\n<b>Usage:</b> <code>/digest on</code> or <code>/digest off</code>",
+                parse_mode='HTML')
+            return
+
+        choice = parts[1].lower()
+        if choice not in ('on', 'off'):
+            bot.reply_to(
+                message,
+                "❌ Please choose <code>on</code> or <code>off</code>.\n\n<b>Example:</b> <code>/digest on</code>",
+                parse_mode='HTML')
+            return
+
+        if not user_settings.set_digest(chat_id, choice == 'on'):
+            raise RuntimeError("Failed to save digest setting")
+        logs.write_log("INFO", f"{chat_id} turned digest mode {choice}")
+
+        if choice == 'on':
+            reply = "✅ <b>Digest mode on.</b>\n\nYou'll get one message with all your stations."
+        else:
+            reply = "✅ <b>Digest mode off.</b>\n\nYou'll get a separate message for each station."
+        bot.reply_to(message, reply, parse_mode='HTML')
+
+    except Exception as e:
+        logs.write_log("ERROR", f"Error in /digest command for user {chat_id}: {e}")
+        try:
+            bot.reply_to(message, "❌ Error occurred while saving your setting. Please try again.")
+        except:
+            pass
+
+
+# Parse "/logs" arguments: [hours like 6 or 6h, days like 2d, or dates
+# YYYY-MM-DD [YYYY-MM-DD]] [level]; returns (start, end, level) in the
+# log's "YYYY-MM-DD HH:MM:SS" form, defaulting to the last 24 hours
+def parse_log_query(args, now):
+    start = end = level = None
+    dates = []
+    for arg in args:
+        if arg.upper() in logs.LEVELS:
+            level = arg.upper()
+        elif re.fullmatch(r"\d{4}-\d{2}-\d{2}", arg):
+            dates.append(arg)
+        elif re.fullmatch(r"\d+(\.\d+)?[hd]?", arg.lower()):
+            amount = float(arg.rstrip('hdHD'))
+            span = timedelta(days=amount) if arg.lower().endswith('d') else timedelta(hours=amount)
+            start = (now - span).strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            raise ValueError(f"Unknown /logs option: {arg}")
+    if dates:
+        start = f"{dates[0]} 00:00:00"
+        end = f"{dates[-1]} 23:59:59"
+    elif start is None:
+        start = (now - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S")
+    return start, end, level
+
+
+# Command: /logs [range] [level] - Download matching log lines as .txt.gz (owner only)
 @bot.message_handler(commands=['logs'])
 def send_logs(message):
     try:
         if str(message.chat.id) == config.OWNER_ID:
-            if os.path.exists(logs.LOG_FILE):
-                try:
-                    with open(logs.LOG_FILE, 'rb') as f:
-                        bot.send_document(message.chat.id, f)
-                except Exception as e:
-                    logs.write_log("ERROR", f"Error sending log file: {e}")
-                    bot.reply_to(message, "❌ Error sending log file.")
-            else:
-                bot.reply_to(message, "📄 Log file not found.")
+            try:
+                start, end, level = parse_log_query(message.text.split()[1:], datetime.now(config.INDIAN_TIMEZONE))
+            except ValueError as e:
+                bot.reply_to(message, f"❌ {e}\nUsage: /logs [6h | 2d | 2025-05-27 [2025-05-28]] [info|error|...]")
+                return
+
+            try:
+                # Only the segments overlapping the range are read, and the
+                # matching lines are compressed as they are streamed out
+                with tempfile.TemporaryFile() as archive:
+                    count = logs.export_logs(archive, start, end, level)
+                    if not count:
+                        bot.reply_to(message, "📄 No log lines match.")
+                        return
+                    archive.seek(0)
+                    scope = f"{start} to {end or 'now'}" + (f", {level} and above" if level else "")
+                    bot.send_document(message.chat.id, archive,
+                                      visible_file_name=f"logs_{start[:10]}.txt.gz",
+                                      caption=f"📄 {count} line(s), {scope}")
+            except Exception as e:
+                logs.write_log("ERROR", f"Error sending log file: {e}")
+                bot.reply_to(message, "❌ Error sending log file.")
         else:
             bot.reply_to(message, "❌ Only the owner can access the logs.")
     except Exception as e:
@@ -1099,6 +1200,80 @@ def send_logs(message):
             pass
 
 
+# Parse "/events" arguments: [hours] [event] [field=value ...] [by=field].
+# hours=, event= and by= set those options; other names the event log's
+# query takes (limit) can't be used as filters and raise ValueError.
+EVENT_QUERY_OPTIONS = ('hours', 'event', 'by')
+EVENT_QUERY_RESERVED = ('limit',)
+
+
+def parse_event_query(args):
+    query = {'hours': 6, 'event': None, 'by': None, 'filters': {}}
+    for arg in args:
+        key, value = arg.split('=', 1) if '=' in arg else (None, arg)
+        if key in EVENT_QUERY_RESERVED:
+            raise ValueError(f"{key}= can't be used as a filter")
+        if key is None and not re.fullmatch(r"\d+(\.\d+)?", value):
+            query['event'] = value
+        elif key is None or key == 'hours':
+            try:
+                hours = float(value)
+            except ValueError:
+                hours = 0
+            if not hours > 0:
+                raise ValueError(f"hours must be a positive number, not {value}")
+            query['hours'] = hours
+        elif key in EVENT_QUERY_OPTIONS:
+            query[key] = value
+        else:
+            query['filters'][key] = value
+    return query
+
+
+# Command: /events - Filter or aggregate recent structured events (owner only)
+@bot.message_handler(commands=['events'])
+def show_events(message):
+    try:
+        if str(message.chat.id) != config.OWNER_ID:
+            bot.reply_to(message, "❌ Only the owner can access events.")
+            return
+
+        try:
+            query = parse_event_query(message.text.split()[1:])
+        except ValueError as e:
+            bot.reply_to(message, f"❌ {e}\nUsage: /events [hours] [event] [field=value ...] [by=field]")
+            return
+        hours, event, by, filters = query['hours'], query['event'], query['by'], query['filters']
+        scope = f"last {hours:g}h" + "".join(f", {key}={value}" for key, value in filters.items())
+
+        if by:
+            groups = event_log.aggregate(by, hours, event, **filters)
+            msg = f"📈 <b>{escape_html(event or 'All')} events by {escape_html(by)}</b> ({escape_html(scope)})\n\n"
+            for value, count, avg_latency in groups[:20]:
+                latency = f" (avg {avg_latency:.2f}s)" if avg_latency is not None else ""
+                msg += f"• {escape_html(str(value))}: {count}{latency}\n"
+            if not groups:
+                msg += "No matching events."
+        else:
+            entries = event_log.query(hours, event, limit=15, **filters)
+            msg = f"📜 <b>Latest {escape_html(event or '')} events</b> ({escape_html(scope)})\n\n"
+            for entry in entries:
+                details = " ".join(str(entry[key]) for key in ('station', 'chat_id', 'path', 'outcome') if key in entry)
+                latency = f" {entry['latency']:.2f}s" if 'latency' in entry else ""
+                msg += f"• {entry['time'][11:19]} {entry['event']} {escape_html(details)}{latency}\n"
+            if not entries:
+                msg += "No matching events."
+
+        bot.reply_to(message, msg, parse_mode='HTML')
+
+    except Exception as e:
+        logs.write_log("ERROR", f"Error in /events command: {e}")
+        try:
+            bot.reply_to(message, "❌ Error occurred while querying events.")
+        except:
+            pass
+
+
 # Command: /stats - Show system stats (owner only)
 @bot.message_handler(commands=['stats'])
 def send_stats(message):
@@ -1165,6 +1340,48 @@ def send_stats(message):
         msg += f"• Sent: {bytes_sent:.2f} MB\n"
         msg += f"• Received: {bytes_recv:.2f} MB\n\n"
 
+        cache_stats = station_cache.stats()
+        msg += "🗄️ <b>Station Cache:</b>\n"
+        msg += f"• Entries: {cache_stats['entries']}\n"
+        msg += f"• Hits/Misses: {cache_stats['hits']}/{cache_stats['misses']}\n"
+        msg += f"• Shared in-flight fetches: {cache_stats['shared']}\n"
+        retry_stats = station_retries.stats()
+        msg += f"• Retrying now: {retry_stats['pending']} ({retry_stats['recovered']} recovered, {retry_stats['exhausted']} gave up)\n"
+        if publish_times is not None:
+            publish_stats = publish_times.stats()
+            learned_range = ""
+            if publish_stats['learned']:
+                learned_range = (f", minute {publish_stats['earliest'] // 60}:{publish_stats['earliest'] % 60:02d}"
+                                 f" to {publish_stats['latest'] // 60}:{publish_stats['latest'] % 60:02d}")
+            msg += f"• Publish times learned: {publish_stats['learned']}/{publish_stats['stations']} station(s){learned_range}\n"
+        render_stats = rendered_messages.stats()
+        msg += f"• Rendered messages: {render_stats['entries']} ({render_stats['hits']} reused, {render_stats['misses']} built)\n\n"
+
+        queue_stats = delivery_queue.stats()
+        msg += "📬 <b>Delivery Queue:</b>\n"
+        msg += f"• Depth: {queue_stats['depth']} ({queue_stats['workers']} workers)\n"
+        msg += f"• Sent/Failed: {queue_stats['sent']}/{queue_stats['failed']}\n"
+        msg += f"• Rate limited (429): {queue_stats['rate_limited']}\n"
+        msg += f"• Wait avg/max: {queue_stats['avg_wait']:.2f}s/{queue_stats['max_wait']:.2f}s\n\n"
+
+        status = status_board.snapshot()
+        msg += "🕒 <b>Scheduler:</b>\n"
+        msg += f"• Last tick: {status.get('scheduler_tick', 'never')}\n"
+        msg += f"• Next broadcast: {status.get('next_fire', 'not scheduled')}\n"
+        msg += f"• Last broadcast: {status.get('last_broadcast', 'never')}"
+        if 'last_broadcast_result' in status:
+            msg += f" ({status['last_broadcast_result']})"
+        msg += "\n"
+        if 'last_recheck' in status:
+            msg += f"• Last re-check: {status['last_recheck']} ({status['last_recheck_result']})\n"
+        msg += "\n"
+
+        pool_stats = handler_pool.stats()
+        msg += "🧵 <b>Command Handlers:</b>\n"
+        msg += f"• Queued: {pool_stats['depth']} across {pool_stats['chats']} chat(s) ({pool_stats['workers']} workers)\n"
+        msg += f"• Handled/Shed: {pool_stats['completed']}/{pool_stats['shed']}\n"
+        msg += f"• Max wait: {pool_stats['max_wait']:.2f}s\n\n"
+
         msg += "🤖 <b>Bot Process:</b>\n"
         msg += f"• Memory: {process_memory:.2f} MB\n"
         msg += f"• Uptime: {int(hours)}h {int(minutes)}m {int(seconds)}s"
@@ -1219,6 +1436,13 @@ def update_proxy(message):
                 parse_mode='HTML')
             return
 
+        if protocol.lower() in SOCKS_SCHEMES and not SOCKS_SUPPORTED:
+            bot.reply_to(
+                message,
+                "❌ SOCKS proxies need the <code>aiohttp-socks</code> package, which isn't installed. Use an http or https proxy.",
+                parse_mode='HTML')
+            return
+
         proxies_data = load_proxies()
 
         # Check if proxy already exists
@@ -1323,6 +1547,21 @@ def delete_proxy(message):
             pass
 
 
+# One-line health summary for a fetch path, for /proxy_list
+def format_path_health(path):
+    entry = proxy_health.paths.get(path)
+    if entry is None:
+        return "📊 No data yet"
+    latency = f"{entry['ewma_ms']:.0f} ms" if entry['ewma_ms'] is not None else "n/a"
+    success_rate = proxy_health.success_rate(path)
+    success = f"{success_rate * 100:.0f}%" if success_rate is not None else "n/a"
+    line = f"⏱️ {latency} | ✅ {success} of {entry['successes'] + entry['failures']}"
+    if proxy_health.cooling_down(path):
+        remaining = int(entry['cooldown_until'] - time.time())
+        line += f" | 🧊 cooldown {remaining}s"
+    return line
+
+
 # Command: /proxy_list - List all proxies with protocols and serial numbers (owner only)
 @bot.message_handler(commands=['proxy_list'])
 def proxy_list(message):
@@ -1346,10 +1585,13 @@ def proxy_list(message):
                     msg += f"{serial_counter}. <code>{ip_port}</code> ({protocol.upper()})\n"
                 except:
                     msg += f"{serial_counter}. <code>{proxy}</code> (Invalid format)\n"
+                msg += f"   {format_path_health(proxy)}\n"
                 serial_counter += 1
         else:
             msg += "✅ <b>Proxies:</b> None\n"
 
+        msg += f"\n🌐 <b>Direct:</b> {format_path_health('direct')}\n"
+
         msg += f"\n💡 <b>Commands:</b>\n• <code>/update_proxy ip:port:protocol</code>\n• <code>/delete_proxy &lt;serial_number&gt;</code>"
 
         bot.reply_to(message, msg, parse_mode='HTML')
@@ -1394,7 +1636,17 @@ def download_user_data(message):
         report += f"📊 SUMMARY:\n"
         report += f"Total Users: {total_users}\n"
         report += f"Total Subscriptions: {total_subscriptions}\n"
-        report += f"Average Subscriptions per User: {total_subscriptions/total_users:.2f}\n\n"
+        report += f"Average Subscriptions per User: {total_subscriptions/total_users:.2f}\n"
+
+        # Per-station counts come from the maintained reverse index
+        station_counts = subscription_store.station_counts()
+        report += f"Unique Stations (upstream fetches per hour): {len(station_counts)}\n\n"
+
+        report += "📡 STATION SUBSCRIBERS:\n"
+        report += "-" * 30 + "\n"
+        for suffix, count in sorted(station_counts.items(), key=lambda item: (-item[1], item[0])):
+            report += f"Station {suffix}: {count} subscriber(s)\n"
+        report += "\n"
 
         report += "👤 USER DETAILS:\n"
         report += "-" * 30 + "\n"
@@ -1481,7 +1733,7 @@ def modify_user(message):
                 parse_mode='HTML')
             return
 
-        subscriptions = load_subscriptions()
+        subscriptions = load_user_subscriptions(target_chat_id)
 
         # Initialize user if not exists
         if target_chat_id not in subscriptions:
@@ -1539,11 +1791,9 @@ def modify_user(message):
 
                 result_msg = f"✅ <b>Subscriptions replaced!</b>\n\n👤 <b>Chat ID:</b> {target_chat_id}\n🔄 <b>New subscriptions:</b> {', '.join(subscriptions[target_chat_id])}\n📊 <b>Total subscriptions:</b> {len(subscriptions[target_chat_id])}/{config.MAX_SUBSCRIPTIONS_PER_USER}"
 
-        # Clean up empty subscription lists
-        if not subscriptions[target_chat_id]:
-            del subscriptions[target_chat_id]
-
-        save_subscriptions(subscriptions)
+        # Write only this user's document; an empty list removes it
+        if not subscription_store.replace(target_chat_id, subscriptions[target_chat_id]):
+            raise RuntimeError(f"Failed to save subscriptions for {target_chat_id}")
         logs.write_log(
             "INFO",
             f"Owner modified user {target_chat_id} subscriptions: {action}")
@@ -1576,7 +1826,7 @@ def modify_user(message):
                     parse_mode='HTML')
                 return
 
-            subscriptions = load_subscriptions()
+            subscriptions = load_user_subscriptions(target_chat_id)
 
             if target_chat_id not in subscriptions:
                 bot.reply_to(
@@ -1636,274 +1886,419 @@ def modify_user(message):
                 pass
 
 
+# Per-host semaphores so a broadcast can't open unbounded connections to the
+# upstream server or to a single proxy. Only touched from the engine loop.
+host_semaphores = {}
+
+
+def host_limit(host):
+    semaphore = host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_REQUESTS_PER_HOST)
+        host_semaphores[host] = semaphore
+    return semaphore
+
+
+# Health of each fetch path (a proxy entry or "direct"): EWMA latency, success
+# rate and a cooldown after consecutive failures, used to rank proxies
+class ProxyHealth:
+    def __init__(self, alpha=0.3, cooldown_after=3, cooldown_seconds=300):
+        self.alpha = alpha
+        self.cooldown_after = cooldown_after
+        self.cooldown_seconds = cooldown_seconds
+        self.paths = {}  # path -> stats dict
+        self.latencies = {}  # path -> recent successful latencies (seconds)
+        self.dirty = set()
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+
+    def _entry(self, path):
+        entry = self.paths.get(path)
+        if entry is None:
+            entry = {'ewma_ms': None, 'successes': 0, 'failures': 0,
+                     'consecutive_failures': 0, 'cooldown_until': 0.0}
+            self.paths[path] = entry
+        return entry
+
+    def record(self, path, ok, latency):
+        with self.lock:
+            entry = self._entry(path)
+            if ok:
+                latency_ms = latency * 1000
+                if entry['ewma_ms'] is None:
+                    entry['ewma_ms'] = latency_ms
+                else:
+                    entry['ewma_ms'] += self.alpha * (latency_ms - entry['ewma_ms'])
+                entry['successes'] += 1
+                self.latencies.setdefault(path, deque(maxlen=50)).append(latency)
+                entry['consecutive_failures'] = 0
+                entry['cooldown_until'] = 0.0
+            else:
+                entry['failures'] += 1
+                entry['consecutive_failures'] += 1
+                if entry['consecutive_failures'] >= self.cooldown_after:
+                    entry['cooldown_until'] = time.time() + self.cooldown_seconds
+                    if entry['consecutive_failures'] == self.cooldown_after:
+                        logs.write_log("INFO", f"Path {path} cooling down for {self.cooldown_seconds}s after {self.cooldown_after} consecutive failures")
+            self.dirty.add(path)
+
+    def success_rate(self, path):
+        entry = self.paths.get(path)
+        if entry is None:
+            return None
+        attempts = entry['successes'] + entry['failures']
+        return entry['successes'] / attempts if attempts else None
+
+    def p90(self, path):
+        samples = sorted(self.latencies.get(path, ()))
+        if len(samples) < 5:
+            return None
+        return samples[int(0.9 * (len(samples) - 1))]
+
+    def hedge_delay(self, path, minimum, maximum):
+        """Seconds to wait on a path before hedging: its p90 latency, clamped"""
+        p90 = self.p90(path)
+        if p90 is None:
+            entry = self.paths.get(path)
+            p90 = entry['ewma_ms'] * 2 / 1000 if entry and entry['ewma_ms'] else maximum
+        return min(max(p90, minimum), maximum)
+
+    def cooling_down(self, path):
+        entry = self.paths.get(path)
+        return entry is not None and entry['cooldown_until'] > time.time()
+
+    def score(self, path):
+        # Smoothed success rate per second of expected latency; paths without
+        # history get a neutral score so they are tried and measured
+        entry = self.paths.get(path)
+        if entry is None:
+            return 0.5
+        success = (entry['successes'] + 1) / (entry['successes'] + entry['failures'] + 2)
+        latency_s = (entry['ewma_ms'] or 2000) / 1000
+        return success / max(latency_s, 0.05)
+
+    def rank(self, paths):
+        """Paths not cooling down, best first (or the one recovering soonest if all are)"""
+        available = [path for path in paths if not self.cooling_down(path)]
+        if not available and paths:
+            available = [min(paths, key=lambda path: self.paths[path]['cooldown_until'])]
+        return sorted(available, key=self.score, reverse=True)
+
+    def load(self, collection):
+        try:
+            for doc in collection.find():
+                path = doc.pop('_id')
+                doc.pop('updated_at', None)
+                entry = self._entry(path)
+                entry.update({key: doc[key] for key in entry if key in doc})
+            logs.write_log("INFO", f"Loaded proxy health for {len(self.paths)} path(s)")
+        except Exception as e:
+            logs.write_log("ERROR", f"Error loading proxy health from MongoDB: {e}")
+
+    def flush(self, collection, force=False):
+        """Write changed scores to MongoDB, at most every PROXY_HEALTH_FLUSH_INTERVAL seconds"""
+        with self.lock:
+            if not self.dirty or (not force and time.time() - self.last_flush < config.PROXY_HEALTH_FLUSH_INTERVAL):
+                return
+            operations = [
+                UpdateOne({'_id': path},
+                          {'$set': dict(self.paths[path], updated_at=datetime.now(config.INDIAN_TIMEZONE))},
+                          upsert=True)
+                for path in self.dirty
+            ]
+            self.dirty.clear()
+            self.last_flush = time.time()
+        try:
+            collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logs.write_log("ERROR", f"Error saving proxy health to MongoDB: {e}")
+
+
+proxy_health = ProxyHealth(alpha=config.PROXY_HEALTH_EWMA_ALPHA,
+                           cooldown_after=config.PROXY_COOLDOWN_AFTER_FAILURES,
+                           cooldown_seconds=config.PROXY_COOLDOWN_SECONDS)
+
+
+# Persist proxy health scores if the flush interval has passed (or force=True)
+def flush_proxy_health(force=False):
+    if db is not None:
+        proxy_health.flush(db.proxy_health, force)
+
+
+# A path is healthy if it delivered the station table, or the upstream's own
+# "station does not exist" page; anything else (a proxy error page, a captive
+# portal, TABLE_NOT_FOUND_ERROR) counts as a failure
+def is_healthy_page(table_data, error):
+    return bool(table_data) or error == INVALID_STATION_ERROR
+
+
 # Async function to fetch data from a URL using a proxy
-async def fetch_data_async(url, proxy_entry, session):
+async def fetch_data_async(url, proxy_entry, timeout=10):
+    started = time.monotonic()
     try:
         if ':' not in proxy_entry:
             return None, f"Invalid proxy format: {proxy_entry}"
 
         proxy, scheme = proxy_entry.rsplit(':', 1)
-        proxy_url = f"{scheme}://{proxy.split(':')[0]}:{proxy.split(':')[1]}"
-        
-        async with session.get(url, proxy=proxy_url, timeout=10) as response:
-            html = await response.text()
-            
-            # Check for invalid range error
-            if "Invalid Range" in html:
-                return None, "Invalid station ID - station does not exist"
-
-            table_start = html.find('<table')
-            table_end = html.find('</table>') + len('</table>')
-            if table_start == -1 or table_end == -1:
-                return None, "Table not found in HTML"
-
-            table_html = html[table_start:table_end]
-            rows = [
-                row.strip() for row in table_html.split('<tr>')[1:]
-                if '</tr>' in row
-            ]
-            table_data = []
+        proxy_url = f"{scheme.lower()}://{proxy.split(':')[0]}:{proxy.split(':')[1]}"
+
+        session = await http_pool.session(proxy_url)
+        async with host_limit(proxy.split(':')[0]):
+            started = time.monotonic()
+            async with session.get(url, proxy=http_pool.request_proxy(proxy_url),
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                # Parse rows as the body streams in instead of buffering the page
+                table_data, error = await parse_table_stream(
+                    response.content.iter_chunked(8192), response.charset or 'utf-8')
+                proxy_health.record(proxy_entry, is_healthy_page(table_data, error), time.monotonic() - started)
+                if error:
+                    return None, error
+
+                return table_data, proxy_entry
+    except Exception as e:
+        proxy_health.record(proxy_entry, False, time.monotonic() - started)
+        return None, str(e)
 
-            for row in rows:
-                cells = [
-                    cell.strip() for cell in row.split('<td>')[1:]
-                    if '</td>' in cell
-                ]
-                if len(cells) >= 2:
-                    key = cells[0].split('</td>')[0].replace(
-                        '<span class="style46">', '').replace('</span>',
-                                                              '').strip()
-                    value = cells[1].split('</td>')[0]
-                    while '<' in value and '>' in value:
-                        start = value.find('<')
-                        end = value.find('>', start) + 1
-                        if end == 0:
-                            break
-                        value = value[:start] + value[end:]
-                    value = value.strip()
-
-                    # Skip Latitude and Longitude entries
-                    if key.lower() in ['latitude', 'longitude']:
-                        continue
-
-                    table_data.append((key, value))
-
-            return table_data, proxy_entry
+
+# Async function to fetch data from a URL without a proxy
+async def fetch_data_direct_async(url, timeout=10):
+    started = time.monotonic()
+    try:
+        session = await http_pool.session()
+        async with host_limit(urlsplit(url).hostname):
+            started = time.monotonic()
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                table_data, error = await parse_table_stream(
+                    response.content.iter_chunked(8192), response.charset or 'utf-8')
+                proxy_health.record("direct", is_healthy_page(table_data, error), time.monotonic() - started)
+                if error:
+                    return None, error
+
+                return table_data, "direct"
     except Exception as e:
+        proxy_health.record("direct", False, time.monotonic() - started)
         return None, str(e)
 
-# Async function to try multiple proxies concurrently with retry mechanism
-async def fetch_with_proxies_async(url, proxies):
-    # First attempt with standard timeout
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for proxy_entry in proxies:
-            task = asyncio.create_task(fetch_data_async(url, proxy_entry, session))
-            tasks.append(task)
-        
-        # Wait for first successful result or all to complete
+# Async function to fetch a URL over one path: "direct" or a proxy entry
+# Every attempt is recorded as a "fetch" event
+async def fetch_path_async(url, path, timeout=10):
+    station = url[len(config.URL_PREFIX):] if config.URL_PREFIX and url.startswith(config.URL_PREFIX) else url
+    started = time.monotonic()
+    try:
+        if path == "direct":
+            table_data, result = await fetch_data_direct_async(url, timeout)
+        else:
+            table_data, result = await fetch_data_async(url, path, timeout)
+    except asyncio.CancelledError:
+        # Lost a race or hedge to another path
+        event_log.record("fetch", station=station, path=path,
+                         latency=round(time.monotonic() - started, 3), outcome="cancelled")
+        raise
+    if table_data:
+        outcome, error = "ok", None
+    elif INVALID_STATION_ERROR in str(result):
+        outcome, error = "invalid", None
+    else:
+        outcome, error = "error", result
+    event_log.record("fetch", station=station, path=path,
+                     latency=round(time.monotonic() - started, 3), outcome=outcome, error=error)
+    return table_data, result
+
+
+# A page that says the station doesn't exist is an answer, not a path failure
+def is_final_result(table_data, result):
+    return bool(table_data) or INVALID_STATION_ERROR in str(result)
+
+
+# Wait for the first final result among running tasks, cancelling the rest
+async def first_final_result(tasks):
+    last_result = None
+    try:
         for completed_task in asyncio.as_completed(tasks):
             table_data, result = await completed_task
-            if table_data:  # If we got data successfully
-                # Cancel all other tasks
+            if is_final_result(table_data, result):
+                return table_data, result
+            last_result = result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return None, last_result
+
+
+# Policy "race-all": send to every candidate path at once, first answer wins
+async def fetch_race_all_async(url, paths, timeout=10):
+    tasks = [asyncio.create_task(fetch_path_async(url, path, timeout)) for path in paths]
+    return await first_final_result(tasks)
+
+
+# Policy "sequential": try candidate paths one at a time, best first
+async def fetch_sequential_async(url, paths, timeout=10):
+    result = None
+    for path in paths:
+        table_data, result = await fetch_path_async(url, path, timeout)
+        if is_final_result(table_data, result):
+            return table_data, result
+    return None, result
+
+
+# Policy "hedged": start with the best path and only add the next one if no
+# answer arrived within that path's p90 latency (or as soon as one fails)
+async def fetch_hedged_async(url, paths, timeout=10):
+    tasks = []
+    last_result = None
+    try:
+        for path in paths:
+            tasks.append(asyncio.create_task(fetch_path_async(url, path, timeout)))
+            delay = proxy_health.hedge_delay(path, config.HEDGE_MIN_DELAY, config.HEDGE_MAX_DELAY)
+            deadline = time.monotonic() + delay
+            # Wait out the hedge delay, but move on early once nothing is running
+            while True:
+                pending = [task for task in tasks if not task.done()]
+                remaining = deadline - time.monotonic()
+                if not pending or remaining <= 0:
+                    break
+                await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
                 for task in tasks:
-                    if not task.done():
-                        task.cancel()
-                return table_data, result  # Return the successful result
-    
-    # If we get here, all proxies failed on first attempt, try retries
-    logs.write_log("INFO", f"All proxies failed for URL {url}, implementing async retry")
-    
+                    if task.done() and not task.cancelled():
+                        table_data, result = task.result()
+                        if is_final_result(table_data, result):
+                            return table_data, result
+                        last_result = result
+        # Every path has been started; take the first answer among the rest
+        pending = [task for task in tasks if not task.done()]
+        if pending:
+            table_data, result = await first_final_result(pending)
+            return table_data, result or last_result
+        return None, last_result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+FETCH_STRATEGIES = {
+    "race-all": fetch_race_all_async,
+    "hedged": fetch_hedged_async,
+    "sequential": fetch_sequential_async,
+}
+
+
+# Async function to fetch a URL over the healthiest paths using config.FETCH_POLICY
+async def fetch_with_policy_async(url, paths, timeout=10):
+    strategy = FETCH_STRATEGIES.get(config.FETCH_POLICY, fetch_hedged_async)
+    candidates = proxy_health.rank(paths)[:config.PROXY_TOP_K]
+    if not candidates:
+        return None, "No fetch paths available"
+    return await strategy(url, candidates, timeout)
+
+
+# Async function to fetch over the given paths, with longer-timeout retry rounds
+async def fetch_with_proxies_async(url, paths):
+    table_data, result = await fetch_with_policy_async(url, paths)
+    if is_final_result(table_data, result):
+        return table_data, result
+
+    # If we get here, every candidate failed on the first attempt, try retries
+    logs.write_log("INFO", f"All paths failed for URL {url}, implementing async retry")
+
     # Try up to 2 more times with different timeouts
     for retry_attempt in range(2):
         logs.write_log("INFO", f"Async retry attempt {retry_attempt+1}/2")
-        
-        # Increase timeout for retries: 15s, 20s
+
+        # Increase timeout for retries: 15s, 20s; paths are re-ranked so ones
+        # that just went into cooldown are skipped
         timeout = 15 + (retry_attempt * 5)
-        
-        # Try each proxy again with increased timeout
-        for proxy_entry in proxies:
-            try:
-                # Create a custom session with longer timeout for retries
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as retry_session:
-                    table_data, result = await fetch_data_async(url, proxy_entry, retry_session)
-                    if table_data:  # Success
-                        return table_data, f"{result} (retry {retry_attempt+1})"  # Return the successful result
-            except Exception as e:
-                continue  # Try next proxy
-    
-    # If we get here, all proxies failed after retries
-    return None, "All proxies failed after retries"
-
-# Async function to fetch multiple URLs concurrently with retry mechanism
-async def fetch_multiple_urls_async(urls, proxies):
-    results = {}
-    async with aiohttp.ClientSession() as session:
-        tasks = {}
-        
-        # Create tasks for each URL
-        for url_key, url in urls.items():
-            # For each URL, try all proxies concurrently
-            url_tasks = []
-            for proxy_entry in proxies:
-                task = asyncio.create_task(fetch_data_async(url, proxy_entry, session))
-                url_tasks.append(task)
-            tasks[url_key] = url_tasks
-        
-        # Process each URL's tasks
-        for url_key, url_tasks in tasks.items():
-            # Wait for first successful result for this URL or all to complete
-            success = False
-            for completed_task in asyncio.as_completed(url_tasks):
-                table_data, result = await completed_task
-                if table_data:  # If we got data successfully
-                    # Cancel all other tasks for this URL
-                    for task in url_tasks:
-                        if not task.done():
-                            task.cancel()
-                    results[url_key] = (table_data, result)
-                    success = True
-                    break
-            
-            # If no successful result for this URL, try with retry
-            if not success:
-                logs.write_log("INFO", f"All proxies failed for {url_key}, implementing async retry")
-                
-                # Try up to 2 more times with different timeouts
-                for retry_attempt in range(2):
-                    logs.write_log("INFO", f"Async retry attempt {retry_attempt+1}/2 for {url_key}")
-                    
-                    # Increase timeout for retries: 15s, 20s
-                    timeout = 15 + (retry_attempt * 5)
-                    
-                    # Try each proxy again with increased timeout
-                    retry_tasks = []
-                    for proxy_entry in proxies:
-                        # Create a custom session with longer timeout for retries
-                        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as retry_session:
-                            try:
-                                table_data, result = await fetch_data_async(urls[url_key], proxy_entry, retry_session)
-                                if table_data:  # Success
-                                    results[url_key] = (table_data, f"{result} (retry {retry_attempt+1})")
-                                    success = True
-                                    break
-                            except Exception as e:
-                                continue  # Try next proxy
-                    
-                    if success:  # If any proxy succeeded in this retry attempt
-                        break
-                
-                # If still no successful result after retries, store None
-                if not success:
-                    results[url_key] = (None, "All proxies failed after retries")
-        
-        return results
+        table_data, result = await fetch_with_policy_async(url, paths, timeout)
+        if is_final_result(table_data, result):
+            return table_data, f"{result} (retry {retry_attempt+1})" if table_data else result
 
-# Function to fetch multiple URLs concurrently for a user with multiple subscriptions
-def fetch_multiple_stations_concurrent(chat_id, suffixes):
+    # If we get here, all paths failed after retries
+    return None, "All paths failed after retries"
+
+
+# Async function to fetch one station over direct and every proxy per config.FETCH_POLICY
+async def fetch_station_async(suffix, proxies):
+    url = f"{config.URL_PREFIX}{suffix}"
+    return await fetch_with_proxies_async(url, ["direct"] + list(proxies))
+
+
+# Async function to get one station, from the cache when it's still fresh
+# Concurrent callers for the same station share a single upstream fetch
+async def get_station_async(suffix, proxies):
+    return await station_cache.get_or_fetch(
+        suffix, lambda: fetch_station_async(suffix, proxies))
+
+
+# Function to get one station from synchronous code (bot handlers)
+def fetch_station(suffix):
+    proxies = get_valid_proxies()
+    try:
+        return engine.run(get_station_async(suffix, proxies))
+    except Exception as e:
+        logs.write_log("ERROR", f"Error fetching station {suffix}: {e}")
+        return None, str(e)
+    finally:
+        flush_proxy_health()
+
+
+# Async function to fetch several stations at once
+async def fetch_stations_async(suffixes, proxies):
+    results = await asyncio.gather(
+        *(get_station_async(suffix, proxies) for suffix in suffixes))
+    return dict(zip(suffixes, results))
+
+
+# Function to fetch several stations concurrently without sending anything
+# Returns {suffix: (table_data, result)} where result is the source or the error
+def fetch_stations_concurrent(suffixes):
     logs.write_log("INFO", f"=== Starting multi-station data fetch ===")
-    logs.write_log("INFO", f"Connection priority configured: {config.CONNECTION_PRIORITY}")
+    logs.write_log("INFO", f"Fetch policy configured: {config.FETCH_POLICY}")
     logs.write_log("INFO", f"Number of stations to fetch: {len(suffixes)}")
-    proxies_data = load_proxies()
-    valid_proxies_available = False
-    
-    if proxies_data and "proxies" in proxies_data and isinstance(proxies_data["proxies"], list) and proxies_data["proxies"]:
-        valid_proxies_available = True
-        logs.write_log("INFO", f"Valid proxies available: {len(proxies_data['proxies'])}")
+    proxies = get_valid_proxies()
+    if proxies:
+        logs.write_log("INFO", f"Valid proxies available: {len(proxies)}")
     else:
         logs.write_log("INFO", "No valid proxies available")
 
-    success_count = 0
-    results = {}  # key: suffix, value: (table_data, error)
+    try:
+        return engine.run(fetch_stations_async(list(suffixes), proxies))
+    except Exception as e:
+        logs.write_log("ERROR", f"Error in concurrent multi-station fetch: {e}")
+        return {suffix: (None, str(e)) for suffix in suffixes}
+    finally:
+        flush_proxy_health()
 
-    if config.CONNECTION_PRIORITY == "proxy":
-        # Proxy first priority
-        if valid_proxies_available:
-            # Prepare URLs dictionary
-            urls = {suffix: f"{config.URL_PREFIX}{suffix}" for suffix in suffixes}
-            
-            logs.write_log("INFO", "Trying proxies first for multiple stations (as per config.CONNECTION_PRIORITY)")
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                proxy_results = loop.run_until_complete(
-                    fetch_multiple_urls_async(urls, proxies_data["proxies"]))
-                
-                for suffix, (table_data, result) in proxy_results.items():
-                    results[suffix] = (table_data, result)
-            except Exception as e:
-                logs.write_log("ERROR", f"Error in concurrent multi-station fetch: {e}")
-            finally:
-                loop.close()
-        
-        # For any failed stations or no proxies, try direct
-        for suffix in suffixes:
-            table_data = None
-            if suffix in results:
-                table_data = results[suffix][0]
-            
-            if not table_data:
-                url = f"{config.URL_PREFIX}{suffix}"
-                logs.write_log("INFO", f"Trying direct request for station {suffix} (fallback)")
-                table_data, error = fetch_table_data_direct(url)
-                if table_data:
-                    results[suffix] = (table_data, "direct")
-        
-    elif config.CONNECTION_PRIORITY == "direct":
-        # Direct first priority
-        logs.write_log("INFO", "Trying direct requests first for multiple stations (as per config.CONNECTION_PRIORITY)")
-        for suffix in suffixes:
-            url = f"{config.URL_PREFIX}{suffix}"
-            table_data, error = fetch_table_data_direct(url)
-            if table_data:
-                results[suffix] = (table_data, "direct")
-            else:
-                results[suffix] = (None, error)
-        
-        # For any failed stations, try proxies if available
-        if valid_proxies_available:
-            # Collect failed suffixes
-            failed_suffixes = [s for s, (data, _) in results.items() if not data]
-            if failed_suffixes:
-                urls = {suffix: f"{config.URL_PREFIX}{suffix}" for suffix in failed_suffixes}
-                logs.write_log("INFO", f"Falling back to proxies for {len(failed_suffixes)} stations")
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    proxy_results = loop.run_until_complete(
-                        fetch_multiple_urls_async(urls, proxies_data["proxies"]))
-                    for suffix, (table_data, result) in proxy_results.items():
-                        if table_data:
-                            results[suffix] = (table_data, result)
-                except Exception as e:
-                    logs.write_log("ERROR", f"Error in fallback proxy fetch: {e}")
-                finally:
-                    loop.close()
+# Function to fetch multiple URLs concurrently for a user with multiple subscriptions
+def fetch_multiple_stations_concurrent(chat_id, suffixes):
+    success_count = 0
+    results = fetch_stations_concurrent(suffixes)
+    digest = wants_digest(chat_id)
+    blocks = []
 
     # Process all results
     for suffix, (table_data, result) in results.items():
         if table_data:
             formatted_data = format_table_data(table_data, suffix)
-            bot.send_message(chat_id, formatted_data, parse_mode='HTML')
+            if digest:
+                blocks.append(formatted_data)
+            else:
+                bot.send_message(chat_id, formatted_data, parse_mode='HTML')
             logs.write_log("INFO", f"Success for station {suffix} via {result}")
             success_count += 1
         else:
             logs.write_log("ERROR", f"All methods failed for station {suffix}")
 
+    # Digest mode: one message for all stations, split only at the length limit
+    for text in build_digest_messages(blocks):
+        bot.send_message(chat_id, text, parse_mode='HTML')
+
     return success_count > 0
 
 # Function to check proxies and fetch data concurrently
-def check_proxies_and_fetch_concurrent(url, chat_id, message_id=None, is_manual=False, suffix=None):
+# Served from the station cache when the data is still fresh
+def check_proxies_and_fetch_concurrent(chat_id, message_id=None, is_manual=False, suffix=None):
     logs.write_log("INFO", f"=== Starting concurrent data fetch ===")
-    logs.write_log("INFO", f"Connection priority configured: {config.CONNECTION_PRIORITY}")
-    proxies_data = load_proxies()
-    valid_proxies_available = False
-    
-    if proxies_data and "proxies" in proxies_data and isinstance(proxies_data["proxies"], list) and proxies_data["proxies"]:
-        valid_proxies_available = True
-        logs.write_log("INFO", f"Valid proxies available: {len(proxies_data['proxies'])}")
-    else:
-        logs.write_log("INFO", "No valid proxies available")
 
     # Send acknowledgment message for manual fetch
     if is_manual and not message_id:
@@ -1911,90 +2306,26 @@ def check_proxies_and_fetch_concurrent(url, chat_id, message_id=None, is_manual=
                                    "🔄 Fetching latest weather data...")
         message_id = ack_msg.message_id
 
-    # Check if we should try direct first
-    if config.CONNECTION_PRIORITY == "direct":
-        logs.write_log("INFO", "Trying direct request first (as per config.CONNECTION_PRIORITY)")
-        table_data, error = fetch_table_data_direct(url)
-        if table_data:
-            formatted_data = format_table_data(table_data, suffix)
-            if message_id:
-                try:
-                    bot.edit_message_text(formatted_data,
-                                          chat_id,
-                                          message_id,
-                                          parse_mode='HTML')
-                except Exception as e:
-                    bot.send_message(chat_id,
-                                     formatted_data,
-                                     parse_mode='HTML')
-            else:
-                bot.send_message(chat_id, formatted_data, parse_mode='HTML')
-            logs.write_log("INFO", "Direct request SUCCESS (first attempt, concurrent)")
-            return True
-        else:
-            logs.write_log("ERROR", f"Direct request failed: {error}")
-            if not valid_proxies_available:
-                return False
-            logs.write_log("INFO", "Falling back to proxies (concurrent)")
+    table_data, result = fetch_station(suffix)
+    if not table_data:
+        logs.write_log("ERROR", f"All methods failed for station {suffix}: {result}")
+        return False
 
-    # Try proxies (either first or as fallback)
-    if valid_proxies_available:
-        # Run the async function to fetch data concurrently
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    formatted_data = format_table_data(table_data, suffix)
+    if message_id:
         try:
-            table_data, result = loop.run_until_complete(
-                fetch_with_proxies_async(url, proxies_data["proxies"]))
-            
-            if table_data:
-                # Success with one of the proxies
-                formatted_data = format_table_data(table_data, suffix)
-                if message_id:
-                    try:
-                        bot.edit_message_text(formatted_data,
-                                              chat_id,
-                                              message_id,
-                                              parse_mode='HTML')
-                    except Exception as e:
-                        bot.send_message(chat_id,
-                                         formatted_data,
-                                         parse_mode='HTML')
-                else:
-                    bot.send_message(chat_id, formatted_data, parse_mode='HTML')
-                
-                logs.write_log("INFO", f"Proxy {result} SUCCESS (concurrent)")
-                return True
+            bot.edit_message_text(formatted_data,
+                                  chat_id,
+                                  message_id,
+                                  parse_mode='HTML')
         except Exception as e:
-            logs.write_log("ERROR", f"Error in concurrent proxy fetch: {e}")
-        finally:
-            loop.close()
-
-    # If proxy first and proxies failed, or direct first and we haven't tried direct yet
-    if config.CONNECTION_PRIORITY == "proxy":
-        logs.write_log("INFO", "All proxies failed, attempting direct request as fallback")
-        table_data, error = fetch_table_data_direct(url)
-        
-        if table_data:
-            formatted_data = format_table_data(table_data, suffix)
-            if message_id:
-                try:
-                    bot.edit_message_text(formatted_data,
-                                          chat_id,
-                                          message_id,
-                                          parse_mode='HTML')
-                except Exception as e:
-                    bot.send_message(chat_id,
-                                     formatted_data,
-                                     parse_mode='HTML')
-            else:
-                bot.send_message(chat_id, formatted_data, parse_mode='HTML')
-            logs.write_log("INFO", "Direct request SUCCESS (fallback after concurrent failure)")
-            return True
-        else:
-            logs.write_log("ERROR", f"Direct request failed: {error}")
-            return False
-
-    return False
+            bot.send_message(chat_id,
+                             formatted_data,
+                             parse_mode='HTML')
+    else:
+        bot.send_message(chat_id, formatted_data, parse_mode='HTML')
+    logs.write_log("INFO", f"Station {suffix} SUCCESS via {result} (concurrent)")
+    return True
 
 # Start the bot with infinite polling and comprehensive error handling
 def start_bot():
@@ -2021,8 +2352,10 @@ if __name__ == "__main__":
             )
             exit(1)
 
-        # Start Indian time checker in a background thread
-        threading.Thread(target=run_indian_time_checker, daemon=True).start()
+        status_board.set(started_at=datetime.now(config.INDIAN_TIMEZONE))
+        logs.write_log("INFO", f"Loaded {event_log.load()} event(s) from {config.EVENT_LOG_FILE}")
+        # Start the hourly broadcast scheduler in a background thread
+        threading.Thread(target=broadcast_scheduler.run, name="broadcast-scheduler", daemon=True).start()
         logs.write_log("INFO", "Bot started successfully")
         start_bot()
     except KeyboardInterrupt:
@@ -2033,6 +2366,23 @@ if __name__ == "__main__":
         print(f"Fatal error: {e}")
         print("Bot will restart automatically...")
     finally:
+        broadcast_scheduler.stop()
+        handler_pool.stop()
+        event_log.flush()
+        flush_proxy_health(force=True)
+
+        # Send what's still queued, then stop the delivery workers
+        try:
+            engine.run(delivery_queue.close(), timeout=15)
+        except Exception as e:
+            logs.write_log("ERROR", f"Error closing delivery queue: {e}")
+
+        # Close pooled HTTP sessions
+        try:
+            engine.run(http_pool.close(), timeout=10)
+        except Exception as e:
+            logs.write_log("ERROR", f"Error closing HTTP pool: {e}")
+
         # Close MongoDB connection
         if mongo_client:
             mongo_client.close()
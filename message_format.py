@@ -0,0 +1,187 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# Field types in priority order: when a key contains words from several
+# types, the earliest type wins (e.g. "Date & Time" is a date, not a time).
+# A type without a label shows the upstream key itself.
+FIELD_TYPES = (
+    # (field_type, words, emoji, label)
+    ('location', ('location', 'station', 'site'), '📍', 'Location'),
+    ('mandal', ('mandal', 'area'), '🏘️', 'Mandal'),
+    ('updated', ('updated', 'last'), '🕐', 'Last Updated'),
+    ('date', ('date', 'day'), '📅', 'Date'),
+    # Generic time, only reached when none of the above matched
+    ('time', ('time',), '🕐', 'Last Updated'),
+    ('rainfall', ('rainfall', 'rain'), '🌧️', None),
+    ('temperature', ('temperature', 'temp'), '🌡️', None),
+    ('humidity', ('humidity', 'rh'), '💧', None),
+    ('wind', ('wind', 'breeze'), '🌬️', None),
+    ('pressure', ('pressure', 'barometric'), '📊', None),
+)
+
+_PRIORITY = {field_type: index for index, (field_type, _, _, _) in enumerate(FIELD_TYPES)}
+
+# One pass over the key: the lookahead tries every position, so overlapping
+# words are all seen, and at each position the alternation reports the
+# highest-priority type that matches there
+_FIELD_RE = re.compile('(?=(?:' + '|'.join(
+    f"(?P<{field_type}>{'|'.join(words)})" for field_type, words, _, _ in FIELD_TYPES) + '))')
+
+_EMOJI = {field_type: emoji for field_type, _, emoji, _ in FIELD_TYPES}
+_LABEL = {field_type: label for field_type, _, _, label in FIELD_TYPES}
+
+
+# Convert 24-hour time to 12-hour AM/PM format with date
+def convert_to_12hour(datetime_str):
+    try:
+        # Handle full date-time string (e.g., "27/05/2025 21:00" or "27/05/2025 23:00")
+        if ' ' in datetime_str and ':' in datetime_str:
+            date_part, time_part = datetime_str.split(' ', 1)
+
+            # Parse hour and minute
+            if ':' in time_part:
+                hour, minute = map(int, time_part.split(':'))
+
+                # Convert to 12-hour format
+                if hour == 0:
+                    time_12h = f"12:{minute:02d} AM"
+                elif hour < 12:
+                    time_12h = f"{hour}:{minute:02d} AM"
+                elif hour == 12:
+                    time_12h = f"12:{minute:02d} PM"
+                else:
+                    time_12h = f"{hour-12}:{minute:02d} PM"
+
+                return f"{date_part} {time_12h}"
+            else:
+                return datetime_str
+        elif ':' in datetime_str and '/' not in datetime_str:
+            # If no space but has colon, assume it's just time
+            hour, minute = map(int, datetime_str.split(':'))
+            if hour == 0:
+                return f"12:{minute:02d} AM"
+            elif hour < 12:
+                return f"{hour}:{minute:02d} AM"
+            elif hour == 12:
+                return f"12:{minute:02d} PM"
+            else:
+                return f"{hour-12}:{minute:02d} PM"
+        else:
+            return datetime_str
+    except:
+        return datetime_str  # Return original if conversion fails
+
+
+# Classify a (HTML-escaped) key once; the upstream only uses a few dozen keys
+@lru_cache(maxsize=512)
+def classify_field(key):
+    """
+    Return (field_type, row_prefix) for a key, where row_prefix is the
+    rendered "<emoji> <b>Label:</b> " part of its message line.
+    """
+    best = None
+    for match in _FIELD_RE.finditer(key.lower()):
+        field_type = match.lastgroup
+        if best is None or _PRIORITY[field_type] < _PRIORITY[best]:
+            best = field_type
+            if _PRIORITY[best] == 0:
+                break
+
+    if best is None:
+        return 'other', f"<b>{key}:</b> "
+    emoji = _EMOJI[best]
+    label = _LABEL[best] or key
+    # Generic time fields are shown as the last update
+    field_type = 'updated' if best == 'time' else best
+    return field_type, f"{emoji} <b>{label}:</b> "
+
+
+# Escape HTML special characters
+def escape_html(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+# Format table data for Telegram message with flexible field matching
+def format_table_data(table_data, suffix=None):
+    if not table_data:
+        return "No table data extracted"
+
+    parts = ["🌦️ <b>Weather Update</b>"]
+    if suffix:
+        parts.append(f" - Station {suffix}")
+    parts.append("\n\n")
+
+    for key, value in table_data:
+        # Escape HTML characters in key and value
+        key = escape_html(str(key))
+        value = escape_html(str(value))
+
+        field_type, prefix = classify_field(key)
+
+        # Convert time format for updated fields
+        if field_type == 'updated' and ':' in value:
+            value = convert_to_12hour(value)
+        # Add °C if not present and value is numeric
+        elif field_type == 'temperature' and value.replace('.', '').replace(
+                '-', '').isdigit() and '°' not in value:
+            value += "°C"
+
+        parts.append(prefix)
+        parts.append(value)
+        parts.append("\n")
+
+    return "".join(parts)
+
+
+class RenderedMessageCache:
+    """
+    Bounded LRU of rendered station messages keyed by (suffix, variant).
+
+    Each entry remembers the content hash of the table it was rendered from,
+    so a station's message is built once per upstream update and shared by
+    the broadcast, /rf and /subscribe; new data for the station replaces the
+    entry instead of piling up next to it. Safe to use from any thread.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (suffix, variant) -> (content_hash, text)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, table_data, suffix, variant="station"):
+        """Return format_table_data(table_data, suffix), rendering only on a miss"""
+        if not table_data:
+            return format_table_data(table_data, suffix)
+        content_hash = hash(tuple((str(key), str(value)) for key, value in table_data))
+        cache_key = (suffix, variant)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] == content_hash:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        text = format_table_data(table_data, suffix)
+        with self._lock:
+            self._entries[cache_key] = (content_hash, text)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+    def invalidate(self, suffix=None):
+        with self._lock:
+            if suffix is None:
+                self._entries.clear()
+            else:
+                for cache_key in [key for key in self._entries if key[0] == suffix]:
+                    del self._entries[cache_key]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
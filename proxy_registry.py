@@ -0,0 +1,122 @@
+import threading
+import time
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+import logs
+
+# _id of the single document holding the proxy list
+PROXY_DOC_ID = 'proxy_config'
+
+
+class ProxyRegistry:
+    """
+    In-memory copy of the proxy list stored in db.proxies.
+
+    Every save increments a version counter on the document. Readers are
+    served from memory; the stored version is compared at most once every
+    check_interval seconds and the list is reloaded only if it moved, so a
+    change made by another bot instance (or by hand) is picked up without a
+    round trip per fetch. When MongoDB supports change streams (replica sets),
+    watch() reloads the list as soon as it changes and polling is skipped.
+    """
+
+    def __init__(self, collection, tz, check_interval=60):
+        self.collection = collection
+        self.tz = tz
+        self.check_interval = check_interval
+        self._proxies = []
+        self._version = None
+        self._last_check = 0.0
+        self._watching = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the proxy document into memory, creating it if missing"""
+        try:
+            doc = self.collection.find_one({'_id': PROXY_DOC_ID})
+            if doc is None:
+                doc = {
+                    '_id': PROXY_DOC_ID,
+                    'proxies': [],
+                    'version': 0,
+                    'updated_at': datetime.now(self.tz)
+                }
+                self.collection.insert_one(doc)
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error loading proxies from MongoDB: {e}")
+            return False
+        self._apply(doc)
+        return True
+
+    def _apply(self, doc):
+        proxies = doc.get('proxies', [])
+        with self._lock:
+            self._proxies = list(proxies) if isinstance(proxies, list) else []
+            self._version = doc.get('version', 0)
+            self._last_check = time.monotonic()
+
+    def _refresh_if_changed(self):
+        if self._watching or time.monotonic() - self._last_check < self.check_interval:
+            return
+        try:
+            doc = self.collection.find_one({'_id': PROXY_DOC_ID}, {'version': 1})
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error checking proxy list version: {e}")
+            self._last_check = time.monotonic()
+            return
+        if doc is not None and doc.get('version', 0) != self._version:
+            logs.write_log("INFO", f"Proxy list version changed ({self._version} -> {doc.get('version', 0)}), reloading")
+            self.load()
+        else:
+            self._last_check = time.monotonic()
+
+    def get(self):
+        """Return a copy of the current proxy list"""
+        self._refresh_if_changed()
+        with self._lock:
+            return list(self._proxies)
+
+    def save(self, proxies):
+        """Store a new proxy list and bump its version"""
+        try:
+            doc = self.collection.find_one_and_update(
+                {'_id': PROXY_DOC_ID},
+                {'$set': {'proxies': list(proxies), 'updated_at': datetime.now(self.tz)},
+                 '$inc': {'version': 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER)
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error saving proxies to MongoDB: {e}")
+            return False
+        self._apply(doc)
+        return True
+
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def watch(self):
+        """Reload on change-stream events in a daemon thread, if supported"""
+        def run():
+            try:
+                with self.collection.watch([{'$match': {'documentKey._id': PROXY_DOC_ID}}],
+                                           full_document='updateLookup') as stream:
+                    self._watching = True
+                    logs.write_log("INFO", "Watching proxy list for changes")
+                    for change in stream:
+                        doc = change.get('fullDocument')
+                        if doc is not None:
+                            self._apply(doc)
+                        else:
+                            self.load()
+            except PyMongoError as e:
+                logs.write_log("INFO", f"Proxy change stream unavailable, polling the version instead: {e}")
+            finally:
+                self._watching = False
+
+        thread = threading.Thread(target=run, name="proxy-watch", daemon=True)
+        thread.start()
+        return thread
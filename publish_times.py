@@ -0,0 +1,144 @@
+import math
+import threading
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+import logs
+from station_cache import find_last_updated, parse_last_updated
+
+
+class PublishTimeLearner:
+    """
+    Learns when in the hour each station's upstream data actually updates.
+
+    Samples are seconds after the top of the hour at which a scheduled
+    upstream fetch first saw a new "Last Updated" value stamped in that
+    hour (cached copies are never observed). A sample is only taken when
+    the old value was fetched earlier in the same hour, so the change
+    happened between two of our fetches (an exact sample). The one exception is the
+    first pre-fetch poll of the hour: if the data is already new there, the
+    station publishes earlier than we look, and the poll time is kept as an
+    upper bound; it also pulls older upper bounds down to it, so the
+    schedule keeps moving earlier hour by hour. Upper bounds are only taken
+    when the pre-fetch starts more than `margin` seconds before the fire
+    time (learn_upper_bounds), otherwise they would push it later.
+
+    A station with at least min_samples samples is fetched `margin` seconds
+    after their p95; the others keep using the configured default. The last
+    `window` samples per station are kept in memory and in MongoDB.
+    """
+
+    def __init__(self, collection, tz, default_offset, window=48, min_samples=5,
+                 margin=20, percentile=0.95, max_offset=3540, learn_upper_bounds=True):
+        self.collection = collection
+        self.tz = tz
+        self.default_offset = default_offset
+        self.window = window
+        self.min_samples = min_samples
+        self.margin = margin
+        self.percentile = percentile
+        self.max_offset = max_offset
+        self.learn_upper_bounds = learn_upper_bounds
+        self._samples = {}     # suffix -> [[seconds after the hour, exact]]
+        self._last_value = {}  # suffix -> last "Last Updated" value seen
+        self._last_seen = {}   # suffix -> when that value was last seen
+        self._lock = threading.Lock()
+
+    def load(self):
+        samples = {}
+        last_value = {}
+        try:
+            for doc in self.collection.find():
+                samples[doc['_id']] = [
+                    list(sample) if isinstance(sample, (list, tuple)) else [sample, True]
+                    for sample in (doc.get('samples') or [])][-self.window:]
+                if doc.get('last_value'):
+                    last_value[doc['_id']] = doc['last_value']
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error loading station publish times from MongoDB: {e}")
+            return False
+        with self._lock:
+            self._samples = samples
+            self._last_value = last_value
+        logs.write_log("INFO", f"Loaded publish times for {len(samples)} station(s)")
+        return True
+
+    def observe(self, suffix, table_data, seen_at=None, first_poll=False):
+        """
+        Note the station's "Last Updated" value and, if it is new, record a
+        sample (blocking MongoDB write). first_poll marks the hour's first
+        pre-fetch poll. Returns the sample or None.
+        """
+        value = find_last_updated(table_data)
+        if not value:
+            return None
+        value = value.strip()
+        seen_at = seen_at or datetime.now(self.tz)
+        hour_top = seen_at.replace(minute=0, second=0, microsecond=0)
+        with self._lock:
+            previous = self._last_value.get(suffix)
+            previous_seen = self._last_seen.get(suffix)
+            self._last_value[suffix] = value
+            self._last_seen[suffix] = seen_at
+            if previous == value:
+                return None
+
+        # Only a reading stamped in this hour was published in it; an older
+        # one is last hour's data seen late (or a station that stopped
+        # updating), not a publish time
+        reading = parse_last_updated(value, self.tz)
+        offset = None
+        if previous is not None and reading is not None and reading >= hour_top:
+            offset = int((seen_at - hour_top).total_seconds())
+            exact = previous_seen is not None and hour_top <= previous_seen < seen_at
+            if not exact and not (first_poll and self.learn_upper_bounds):
+                offset = None
+
+        with self._lock:
+            samples = self._samples.setdefault(suffix, [])
+            if offset is not None:
+                if not exact:
+                    # Older upper bounds are no tighter than this one
+                    for sample in samples:
+                        if not sample[1] and sample[0] > offset:
+                            sample[0] = offset
+                samples.append([offset, exact])
+                del samples[:-self.window]
+            stored = [list(sample) for sample in samples]
+
+        update = {'$set': {'last_value': value, 'seen_at': seen_at}}
+        if offset is not None:
+            update['$set']['samples'] = stored
+        try:
+            self.collection.update_one({'_id': suffix}, update, upsert=True)
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error saving publish time for station {suffix}: {e}")
+        return offset
+
+    def p95(self, suffix):
+        """Learned publish time in seconds after the hour, or None while learning"""
+        with self._lock:
+            samples = sorted(sample[0] for sample in self._samples.get(suffix) or [])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[max(0, math.ceil(self.percentile * len(samples)) - 1)]
+
+    def fire_offset(self, suffix):
+        """Seconds after the top of the hour to fetch the station at"""
+        learned = self.p95(suffix)
+        if learned is None:
+            return self.default_offset
+        return min(learned + self.margin, self.max_offset)
+
+    def stats(self):
+        with self._lock:
+            suffixes = list(self._samples)
+        learned = [self.p95(suffix) for suffix in suffixes]
+        learned = [offset for offset in learned if offset is not None]
+        return {
+            "stations": len(suffixes),
+            "learned": len(learned),
+            "earliest": min(learned) if learned else None,
+            "latest": max(learned) if learned else None,
+        }
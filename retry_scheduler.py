@@ -0,0 +1,71 @@
+import asyncio
+import random
+
+import logs
+
+
+class RetryScheduler:
+    """
+    Jittered exponential backoff for keyed jobs, run on the engine loop.
+
+    A failed station gets one retry chain no matter how many users or
+    callers are waiting for it: a second caller for the same key awaits the
+    chain that is already running instead of starting its own. Chains only
+    sleep with asyncio.sleep, so other stations keep going. The jitter
+    spreads retries for many failed stations over time, so they don't all
+    hit the upstream or the proxies in the same second.
+    """
+
+    def __init__(self, attempts=3, base_delay=10, max_delay=60, jitter=0.5):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._chains = {}  # key -> asyncio.Task
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+
+    def delay_for(self, attempt):
+        """Backoff before retry number `attempt` (0-based), +/- jitter"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def retry(self, key, attempt_fn, is_done):
+        """
+        Call attempt_fn() -> coroutine until is_done(result) or the attempts
+        run out, and return the last result.
+        """
+        task = self._chains.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_chain(key, attempt_fn, is_done))
+            self._chains[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    async def _run_chain(self, key, attempt_fn, is_done):
+        result = None
+        for attempt in range(self.attempts):
+            delay = self.delay_for(attempt)
+            logs.write_log("INFO", f"Retry {attempt + 1}/{self.attempts} for {key} in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+            self.retries += 1
+            result = await attempt_fn()
+            if is_done(result):
+                self.recovered += 1
+                return result
+        self.exhausted += 1
+        logs.write_log("INFO", f"All {self.attempts} retries failed for {key}")
+        return result
+
+    def _forget(self, key, task):
+        if self._chains.get(key) is task:
+            del self._chains[key]
+
+    def stats(self):
+        return {
+            "pending": len(self._chains),
+            "retries": self.retries,
+            "recovered": self.recovered,
+            "exhausted": self.exhausted,
+        }
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+
+# Return the raw "Last Updated" value from parsed table data, if any
+def find_last_updated(table_data):
+    for key, value in table_data or []:
+        key_lower = key.lower()
+        if 'updated' in key_lower or 'last' in key_lower:
+            return value
+    return None
+
+
+# Parse an upstream "Last Updated" value such as "27/05/2025 21:00"
+def parse_last_updated(value, tz):
+    if not value:
+        return None
+    for fmt in ("%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(value.strip(), fmt).replace(tzinfo=tz)
+        except ValueError:
+            continue
+    return None
+
+
+class StationCache:
+    """
+    Short-lived LRU cache of parsed station tables keyed by station suffix.
+
+    The upstream page only changes once an hour, so an entry stays fresh
+    until the next update is expected: one hour after its "Last Updated"
+    reading plus the station's publish offset, publish_offset(suffix)
+    seconds (its learned publish time), or publish_minute minutes while
+    that returns None. Entries that are already past that
+    point (the upstream is late) are only kept for stale_ttl seconds so
+    retries pick up the new data quickly; entries without a readable
+    timestamp fall back to fallback_ttl.
+
+    get_or_fetch() is single-flight: concurrent callers for the same station
+    share one in-flight fetch. Use it only from the engine event loop.
+    """
+
+    def __init__(self, tz, publish_minute, max_entries=500, fallback_ttl=300, stale_ttl=60,
+                 publish_offset=None):
+        self.tz = tz
+        self.publish_minute = publish_minute
+        self.publish_offset = publish_offset
+        self.max_entries = max_entries
+        self.fallback_ttl = fallback_ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # suffix -> (table_data, source, expires_at)
+        self._inflight = {}            # suffix -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def ttl_for(self, table_data, now=None, suffix=None):
+        """Seconds the given table (of station `suffix`) stays fresh"""
+        now = now or datetime.now(self.tz)
+        last_updated = parse_last_updated(find_last_updated(table_data), self.tz)
+        if last_updated is None:
+            return self.fallback_ttl
+        offset = None
+        if suffix is not None and self.publish_offset is not None:
+            offset = self.publish_offset(suffix)
+        if offset is None:
+            offset = self.publish_minute * 60
+        next_publish = last_updated + timedelta(hours=1, seconds=offset)
+        remaining = (next_publish - now).total_seconds()
+        if remaining <= 0:
+            return self.stale_ttl
+        return remaining
+
+    def get(self, suffix):
+        entry = self._entries.get(suffix)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[2]:
+            del self._entries[suffix]
+            return None
+        self._entries.move_to_end(suffix)
+        return entry[0], entry[1]
+
+    def put(self, suffix, table_data, source):
+        expires_at = time.monotonic() + self.ttl_for(table_data, suffix=suffix)
+        self._entries[suffix] = (table_data, source, expires_at)
+        self._entries.move_to_end(suffix)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, suffix=None):
+        if suffix is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(suffix, None)
+
+    async def get_or_fetch(self, suffix, fetch):
+        """
+        Return (table_data, source) for a station, calling fetch() -> coroutine
+        only on a miss. Failed fetches are not cached.
+        """
+        cached = self.get(suffix)
+        if cached is not None:
+            self.hits += 1
+            return cached[0], "cache"
+
+        task = self._inflight.get(suffix)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._fetch_and_store(suffix, fetch))
+        self._inflight[suffix] = task
+        task.add_done_callback(lambda done: self._forget_inflight(suffix, done))
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, suffix, fetch):
+        table_data, result = await fetch()
+        if table_data:
+            self.put(suffix, table_data, result)
+        return table_data, result
+
+    def _forget_inflight(self, suffix, task):
+        if self._inflight.get(suffix) is task:
+            del self._inflight[suffix]
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+        }
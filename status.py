@@ -0,0 +1,50 @@
+import threading
+from collections import deque
+from datetime import datetime
+
+import config
+
+
+class StatusBoard:
+    """
+    In-memory status of the running bot, for /stats and the webserver.
+
+    Holds the latest value of a few fields (scheduler tick, next fire time,
+    last broadcast) and a ring buffer of the most recent status events.
+    Heartbeats update it instead of the log file, so keeping them current
+    costs nothing on disk.
+    """
+
+    def __init__(self, tz, history=50):
+        self.tz = tz
+        self._fields = {}
+        self._events = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def set(self, **fields):
+        with self._lock:
+            self._fields.update(fields)
+
+    def get(self, name, default=None):
+        with self._lock:
+            return self._fields.get(name, default)
+
+    def event(self, kind, message):
+        """Add an event to the ring buffer, dropping the oldest when full"""
+        with self._lock:
+            self._events.append({'time': datetime.now(self.tz), 'kind': kind, 'message': message})
+
+    def snapshot(self):
+        """Fields and recent events (newest first), with times as ISO strings"""
+        with self._lock:
+            fields = dict(self._fields)
+            events = [dict(event) for event in reversed(self._events)]
+        for values in [fields] + events:
+            for key, value in values.items():
+                if isinstance(value, datetime):
+                    values[key] = value.isoformat(timespec='seconds')
+        fields['recent'] = events
+        return fields
+
+
+status_board = StatusBoard(config.INDIAN_TIMEZONE)
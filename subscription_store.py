@@ -0,0 +1,239 @@
+import threading
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+import logs
+
+
+class SubscriptionStore:
+    """
+    In-memory index of chat_id -> [station suffixes] backed by MongoDB, plus
+    the reverse station -> chat_ids index.
+
+    The collection is read once at startup. After that, reads are served
+    from memory, and each command writes only the document it changed with
+    $addToSet/$pull upserts. The command cost therefore does not grow with
+    the number of users, and the collection is never emptied and rebuilt.
+    MongoDB is written first; memory is updated only if that succeeds,
+    under a lock held only for the in-memory update.
+
+    The reverse index lives in its own collection ({_id: suffix, chat_ids,
+    count}) and is updated by the same write path, so "who subscribes to
+    station X" and per-station counts never need a scan of subscriptions.
+    """
+
+    def __init__(self, collection, station_collection, tz):
+        self.collection = collection
+        self.station_collection = station_collection
+        self.tz = tz
+        self._subscriptions = {}
+        self._stations = {}  # suffix -> [chat_ids]
+        # _lock guards the in-memory indexes only and is never held across a
+        # MongoDB call, so readers on the event loop don't wait for the
+        # network; _write_lock keeps writers (and their MongoDB writes) in order
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index([("chat_id", ASCENDING)], unique=True)
+            return True
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Failed to create unique chat_id index on subscriptions: {e}")
+            return False
+
+    def load(self):
+        """Read every subscription document into memory (startup only)"""
+        subscriptions = {}
+        try:
+            for doc in self.collection.find():
+                chat_id = doc['chat_id']
+                suffixes = doc.get('suffixes', [])
+                # Handle old format conversion; $addToSet needs an array
+                if isinstance(suffixes, str):
+                    suffixes = [suffixes]
+                    self.collection.update_one({'_id': doc['_id']}, {'$set': {'suffixes': suffixes}})
+                if suffixes:
+                    subscriptions[chat_id] = list(suffixes)
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error loading subscriptions from MongoDB: {e}")
+            return False
+
+        stations = {}
+        for chat_id, suffixes in subscriptions.items():
+            for suffix in suffixes:
+                stations.setdefault(suffix, []).append(chat_id)
+
+        with self._lock:
+            self._subscriptions = subscriptions
+            self._stations = stations
+        logs.write_log("INFO", f"Loaded {len(subscriptions)} user subscription(s) across {len(stations)} station(s) into memory")
+        self._sync_station_collection(stations)
+        return True
+
+    def _sync_station_collection(self, stations):
+        # Bring the MongoDB reverse index in line with subscriptions at startup,
+        # which also repairs it after writes made by older versions of the bot
+        try:
+            operations = [
+                UpdateOne({'_id': suffix},
+                          {'$set': {'chat_ids': chat_ids, 'count': len(chat_ids)}},
+                          upsert=True)
+                for suffix, chat_ids in stations.items()
+            ]
+            if operations:
+                self.station_collection.bulk_write(operations, ordered=False)
+            self.station_collection.delete_many({'_id': {'$nin': list(stations)}})
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error rebuilding station subscriber index: {e}")
+
+    def _index_add(self, suffix, chat_id):
+        # Idempotent: the set union keeps count equal to len(chat_ids)
+        self.station_collection.update_one(
+            {'_id': suffix},
+            [{'$set': {'chat_ids': {'$setUnion': [{'$ifNull': ['$chat_ids', []]}, [chat_id]]}}},
+             {'$set': {'count': {'$size': '$chat_ids'}}}],
+            upsert=True)
+
+    def _index_remove(self, suffix, chat_id):
+        self.station_collection.update_one(
+            {'_id': suffix},
+            [{'$set': {'chat_ids': {'$setDifference': [{'$ifNull': ['$chat_ids', []]}, [chat_id]]}}},
+             {'$set': {'count': {'$size': '$chat_ids'}}}])
+        self.station_collection.delete_one({'_id': suffix, 'count': 0})
+
+    def _memory_add(self, suffix, chat_id):
+        # Caller holds self._lock
+        chat_ids = self._stations.setdefault(suffix, [])
+        if chat_id not in chat_ids:
+            chat_ids.append(chat_id)
+
+    def _memory_remove(self, suffix, chat_id):
+        # Caller holds self._lock
+        chat_ids = self._stations.get(suffix, [])
+        if chat_id in chat_ids:
+            chat_ids.remove(chat_id)
+        if not chat_ids:
+            self._stations.pop(suffix, None)
+
+    def all(self):
+        """Return a copy of {chat_id: [suffixes]}"""
+        with self._lock:
+            return {chat_id: list(suffixes) for chat_id, suffixes in self._subscriptions.items()}
+
+    def get(self, chat_id):
+        """Return a copy of one user's suffixes ([] if none)"""
+        with self._lock:
+            return list(self._subscriptions.get(chat_id, []))
+
+    def add(self, chat_id, suffix):
+        with self._write_lock:
+            try:
+                self.collection.update_one(
+                    {'chat_id': chat_id},
+                    {'$addToSet': {'suffixes': suffix},
+                     '$set': {'updated_at': datetime.now(self.tz)}},
+                    upsert=True)
+            except PyMongoError as e:
+                logs.write_log("ERROR", f"Error adding subscription {suffix} for {chat_id}: {e}")
+                return False
+            with self._lock:
+                suffixes = self._subscriptions.setdefault(chat_id, [])
+                if suffix not in suffixes:
+                    suffixes.append(suffix)
+                self._memory_add(suffix, chat_id)
+            self._reindex(chat_id, [], [suffix])
+            return True
+
+    def remove(self, chat_id, suffix):
+        with self._write_lock:
+            try:
+                self.collection.update_one(
+                    {'chat_id': chat_id},
+                    {'$pull': {'suffixes': suffix},
+                     '$set': {'updated_at': datetime.now(self.tz)}})
+                # Users without subscriptions aren't kept in the collection
+                self.collection.delete_one({'chat_id': chat_id, 'suffixes': {'$size': 0}})
+            except PyMongoError as e:
+                logs.write_log("ERROR", f"Error removing subscription {suffix} for {chat_id}: {e}")
+                return False
+            with self._lock:
+                suffixes = self._subscriptions.get(chat_id, [])
+                if suffix in suffixes:
+                    suffixes.remove(suffix)
+                if not suffixes:
+                    self._subscriptions.pop(chat_id, None)
+                self._memory_remove(suffix, chat_id)
+            self._reindex(chat_id, [suffix], [])
+            return True
+
+    def replace(self, chat_id, suffixes):
+        suffixes = list(dict.fromkeys(suffixes))
+        if not suffixes:
+            return self.clear(chat_id)
+        with self._write_lock:
+            try:
+                self.collection.update_one(
+                    {'chat_id': chat_id},
+                    {'$set': {'suffixes': suffixes, 'updated_at': datetime.now(self.tz)}},
+                    upsert=True)
+            except PyMongoError as e:
+                logs.write_log("ERROR", f"Error replacing subscriptions for {chat_id}: {e}")
+                return False
+            with self._lock:
+                previous = self._subscriptions.get(chat_id, [])
+                self._subscriptions[chat_id] = list(suffixes)
+                self._memory_reindex(chat_id, previous, suffixes)
+            self._reindex(chat_id, previous, suffixes)
+            return True
+
+    def clear(self, chat_id):
+        with self._write_lock:
+            try:
+                self.collection.delete_one({'chat_id': chat_id})
+            except PyMongoError as e:
+                logs.write_log("ERROR", f"Error clearing subscriptions for {chat_id}: {e}")
+                return False
+            with self._lock:
+                previous = self._subscriptions.pop(chat_id, [])
+                self._memory_reindex(chat_id, previous, [])
+            self._reindex(chat_id, previous, [])
+            return True
+
+    def _memory_reindex(self, chat_id, previous, current):
+        # Caller holds self._lock
+        for suffix in previous:
+            if suffix not in current:
+                self._memory_remove(suffix, chat_id)
+        for suffix in current:
+            self._memory_add(suffix, chat_id)
+
+    def _reindex(self, chat_id, previous, current):
+        # MongoDB side of the reverse index, written without self._lock held;
+        # a failed write is repaired by _sync_station_collection at startup
+        try:
+            for suffix in previous:
+                if suffix not in current:
+                    self._index_remove(suffix, chat_id)
+            for suffix in current:
+                if suffix not in previous:
+                    self._index_add(suffix, chat_id)
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error updating station index for {chat_id}: {e}")
+
+    def subscribers(self, suffix):
+        """Return a copy of the chat_ids subscribed to one station"""
+        with self._lock:
+            return list(self._stations.get(suffix, []))
+
+    def station_subscribers(self):
+        """Return a copy of {suffix: [chat_ids]} for every subscribed station"""
+        with self._lock:
+            return {suffix: list(chat_ids) for suffix, chat_ids in self._stations.items()}
+
+    def station_counts(self):
+        """Return {suffix: subscriber count}"""
+        with self._lock:
+            return {suffix: len(chat_ids) for suffix, chat_ids in self._stations.items()}
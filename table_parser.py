@@ -0,0 +1,153 @@
+import codecs
+import re
+
+# Rows whose key matches one of these are dropped from the station table
+SKIPPED_KEYS = ('latitude', 'longitude')
+
+INVALID_MARKER = "Invalid Range"
+INVALID_STATION_ERROR = "Invalid station ID - station does not exist"
+TABLE_NOT_FOUND_ERROR = "Table not found in HTML"
+
+
+# Leftmost '<' up to the next '>', matching what the old per-tag loop removed
+_TAG_RE = re.compile(r'<[^>]*>')
+
+TABLE_START = '<table'
+TABLE_END = '</table>'
+
+
+class TableParser:
+    """
+    Incremental parser for the station <table>.
+
+    Feed it the page in chunks as they arrive. Chunks are only collected
+    until the first '</table>' shows up (a short tail of the previous chunk
+    is kept so a split marker is still found); the table is then joined and
+    parsed once, while the rest of the download is only checked for the
+    invalid-station marker. A page whose table never closes has no rows,
+    like the old parser. Rows are split with C-level str.split() and tags
+    are stripped in one regex pass instead of once per tag.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._end_tail = ''
+        self._start_tail = ''
+        self._state = 'collect'  # collect -> done
+        self._tail = ''
+        self.invalid = False
+        self.table_found = False
+        self.rows = []
+
+    def feed(self, chunk):
+        """Add a chunk of HTML and return the rows completed by it"""
+        if not chunk:
+            return []
+
+        # "Invalid Range" may straddle two chunks, so keep a short tail around
+        if not self.invalid:
+            window = self._tail + chunk
+            if INVALID_MARKER in window:
+                self.invalid = True
+            self._tail = window[-(len(INVALID_MARKER) - 1):]
+
+        if self._state == 'done':
+            # A '</table>' came before any '<table': the page has no rows,
+            # but whether it has a table at all decides the error
+            if not self.table_found:
+                window = self._start_tail + chunk
+                self.table_found = TABLE_START in window
+                self._start_tail = window[-(len(TABLE_START) - 1):]
+            return []
+
+        self._chunks.append(chunk)
+        window = self._end_tail + chunk
+        if TABLE_END not in window:
+            self._end_tail = window[-(len(TABLE_END) - 1):]
+            return []
+        return self._finish()
+
+    def close(self):
+        """Parse whatever was collected and return the rows completed by it"""
+        if self._state == 'done':
+            return []
+        return self._finish()
+
+    def result(self):
+        """Return (table_data, error) in the shape the fetch functions use"""
+        if self.invalid:
+            return None, INVALID_STATION_ERROR
+        if not self.table_found:
+            return None, TABLE_NOT_FOUND_ERROR
+        return self.rows, None
+
+    def _finish(self):
+        html = ''.join(self._chunks)
+        self._chunks = []
+        self._state = 'done'
+
+        table_start = html.find(TABLE_START)
+        table_end = html.find(TABLE_END)
+        if table_start == -1:
+            self._start_tail = html[-(len(TABLE_START) - 1):]
+            return []
+        self.table_found = True
+        # Only the first '</table>' counts; without one, or with it before
+        # the table starts, there are no rows
+        if table_end < table_start:
+            return []
+
+        parse_row = self._parse_row
+        completed = []
+        for row in html[table_start:table_end].split('<tr>')[1:]:
+            pair = parse_row(row)
+            if pair is not None:
+                completed.append(pair)
+        self.rows.extend(completed)
+        return completed
+
+    @staticmethod
+    def _parse_row(row):
+        if '</tr>' not in row:
+            return None
+
+        # The first two '<td>' segments that contain a '</td>'
+        key = None
+        for cell in row.split('<td>')[1:]:
+            end = cell.find('</td>')
+            if end == -1:
+                continue
+            if key is None:
+                key = cell[:end]
+                continue
+            value = cell[:end]
+            break
+        else:
+            return None
+
+        key = key.replace('<span class="style46">', '').replace('</span>', '').strip()
+        if key.lower() in SKIPPED_KEYS:
+            return None
+
+        if '<' in value:
+            value = _TAG_RE.sub('', value)
+        return key, value.strip()
+
+
+# Parse a complete HTML page into (table_data, error)
+def parse_table_html(html):
+    parser = TableParser()
+    parser.feed(html)
+    parser.close()
+    return parser.result()
+
+
+# Parse a page from an async iterator of byte chunks (e.g. aiohttp's iter_chunked)
+async def parse_table_stream(chunks, encoding='utf-8'):
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    parser = TableParser()
+    async for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    return parser.result()
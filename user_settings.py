@@ -0,0 +1,67 @@
+import threading
+from datetime import datetime
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+import logs
+
+
+class UserSettingsStore:
+    """
+    Per-user delivery preferences ({chat_id, digest}) backed by MongoDB.
+
+    Settings live in their own collection so they survive a user dropping
+    and re-adding every subscription. Like SubscriptionStore, the collection
+    is read once at startup, reads are served from memory and each change
+    writes only that user's document.
+    """
+
+    def __init__(self, collection, tz, default_digest=False):
+        self.collection = collection
+        self.tz = tz
+        self.default_digest = default_digest
+        self._digest = {}  # chat_id -> bool
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index([("chat_id", ASCENDING)], unique=True)
+            return True
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Failed to create unique chat_id index on user_settings: {e}")
+            return False
+
+    def load(self):
+        digest = {}
+        try:
+            for doc in self.collection.find():
+                if 'digest' in doc:
+                    digest[doc['chat_id']] = bool(doc['digest'])
+        except PyMongoError as e:
+            logs.write_log("ERROR", f"Error loading user settings from MongoDB: {e}")
+            return False
+        with self._lock:
+            self._digest = digest
+        return True
+
+    def digest(self, chat_id):
+        """True if the user gets one combined message instead of one per station"""
+        with self._lock:
+            return self._digest.get(chat_id, self.default_digest)
+
+    def set_digest(self, chat_id, enabled):
+        # The MongoDB write happens outside self._lock, which only guards memory
+        with self._write_lock:
+            try:
+                self.collection.update_one(
+                    {'chat_id': chat_id},
+                    {'$set': {'digest': bool(enabled), 'updated_at': datetime.now(self.tz)}},
+                    upsert=True)
+            except PyMongoError as e:
+                logs.write_log("ERROR", f"Error saving digest setting for {chat_id}: {e}")
+                return False
+            with self._lock:
+                self._digest[chat_id] = bool(enabled)
+            return True
@@ -1,12 +1,49 @@
-from flask import Flask
+import hmac
+
+from flask import Flask, jsonify, request
 from threading import Thread
 
+import config
+from event_log import event_log
+from status import status_board
+
 app = Flask(__name__)
 
 @app.route('/')
 def home():
     return "I'm alive"
 
+@app.route('/status')
+def status():
+    return jsonify(status_board.snapshot())
+
+# /events?token=...&hours=6&event=fetch&outcome=error&by=path aggregates,
+# without by= the latest matching events are listed (up to limit). Events
+# carry chat IDs and error text, so the endpoint needs EVENTS_TOKEN.
+@app.route('/events')
+def events():
+    args = request.args.to_dict()
+    token = args.pop('token', None) or request.headers.get('X-Events-Token', '')
+    if not config.EVENTS_TOKEN:
+        return jsonify({'error': 'events endpoint is disabled (EVENTS_TOKEN not set)'}), 404
+    if not hmac.compare_digest(token.encode(), config.EVENTS_TOKEN.encode()):
+        return jsonify({'error': 'invalid or missing token'}), 401
+    try:
+        hours = float(args.pop('hours', 6))
+        limit = int(args.pop('limit', 100))
+    except ValueError:
+        return jsonify({'error': 'hours must be a number and limit an integer'}), 400
+    if not hours > 0 or limit <= 0:
+        return jsonify({'error': 'hours and limit must be positive'}), 400
+    event = args.pop('event', None)
+    by = args.pop('by', None)
+    if by:
+        groups = event_log.aggregate(by, hours, event, **args)
+        return jsonify({'by': by, 'groups': [
+            {'value': value, 'count': count, 'avg_latency': avg_latency}
+            for value, count, avg_latency in groups[:limit]]})
+    return jsonify({'events': event_log.query(hours, event, limit=limit, **args)})
+
 def run():
     app.run(host='0.0.0.0', port=5091)
 